@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+"""
+benchmark --- Keystroke replay benchmark
+========================================
+
+Generates synthetic directory trees, replays typing sessions through the commands and completers
+and reports latency percentiles per stage.
+
+Trees are generated in tmpfs (/dev/shm) once and reused by following runs.
+Sessions type a path of a random file char by char ('open'), a recursive glob ('glob')
+and a fuzzy query ('goto'). Goto sessions are replayed also over an index of --paths files of a generated,
+but not created tree. The index is saved and loaded, as on a start of the editor. Stages:
+
+    parse       LocatorCore.parseCommand()
+    completer   command.completer()
+    wait        background scanning, AbstractCompleter.wait()
+    inline      AbstractCompleter.inline()
+    rows        texts of the visible rows
+    model       _CompleterModel.setCompleter(). Only with --gui
+    paint       HTMLDelegate.paint() of the visible rows. Only with --gui
+    total       all stages
+    finish      end of the background search of goto, FuzzyFileCompleter.matchedFiles(). Not in total
+
+--gui creates QApplication, so X display (i.e. Xvfb) is required. Example:
+
+    python benchmark.py --sizes 1000,100000 --sessions 10
+"""
+
+import argparse
+import math
+import os
+import os.path
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# API version is set before the project modules import PyQt4, as main.py does. argparse accepts abbreviations
+if __name__ == '__main__' and [arg for arg in sys.argv[1:] if len(arg) > 2 and '--gui'.startswith(arg)]:
+    import sip
+    sip.setapi('QString', 2)
+
+import dirlisting
+import fileindex
+from fuzzycompleter import FuzzyFileCompleter
+from locatorcore import LocatorCore
+from workspace_commands import CommandGotoFile, CommandGotoLine, CommandOpen, CommandSaveAs
+
+
+STAGES = ('parse', 'completer', 'wait', 'inline', 'rows', 'model', 'paint', 'total', 'finish')
+
+"""Count of rows, which are visible in the list. Only they are formatted and painted
+"""
+VISIBLE_ROWS = 30
+
+_SYLLABLES = ('ab', 'co', 'de', 'fi', 'gu', 'ha', 'jo', 'ka', 'li', 'mo', 'nu', 'pe', 'qui', 'ro', 'su',
+              'ta', 'vi', 'wo', 'xe', 'zu')
+_EXTENSIONS = ('.py', '.py', '.py', '.pyc', '.txt', '.c', '.h', '.html', '.js', '')
+
+
+def treeRoot(entryCount):
+    """Directory of the synthetic tree with entryCount entries
+    """
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'locator-benchmark-%d' % entryCount)
+
+
+def _treeEntries(seed):
+    """Generate (path relative to the root, is directory) of the entries of an endless synthetic tree.
+
+    Tree is broad and shallow, like source trees. Some entries are hidden or ignored
+    """
+    rnd = random.Random(seed)
+
+    def name():
+        return ''.join([rnd.choice(_SYLLABLES) for i in range(rnd.randint(2, 4))])
+
+    dirs = ['']
+    count = 0
+    index = 0
+    while True:
+        dirPath = dirs[index % len(dirs)]
+        index += 1
+
+        for i in range(rnd.randint(2, 8)):
+            subdir = os.path.join(dirPath, '%s%d' % (name(), count))
+            dirs.append(subdir)
+            count += 1
+            yield (subdir, True)
+
+        for i in range(rnd.randint(5, 30)):
+            fileName = '%s_%s%d%s' % (name(), name(), count, rnd.choice(_EXTENSIONS))
+            if rnd.random() < 0.05:
+                fileName = '.' + fileName
+            count += 1
+            yield (os.path.join(dirPath, fileName), False)
+
+
+def generateTree(root, entryCount, seed=0):
+    """Create tree with entryCount files and directories, if not created yet.
+
+    Partial tree, left by an interrupted run, is removed and generated again
+    """
+    doneMarker = os.path.join(root, '.complete')
+    if os.path.exists(doneMarker):
+        return
+    if os.path.exists(root):
+        shutil.rmtree(root)
+
+    os.makedirs(root)
+    entries = _treeEntries(seed)
+    count = 0
+    while count < entryCount:
+        relPath, isDir = entries.next()
+        if isDir:
+            os.mkdir(os.path.join(root, relPath))
+        else:
+            open(os.path.join(root, relPath), 'w').close()
+        count += 1
+
+    open(doneMarker, 'w').close()
+
+
+def generatePaths(pathCount, seed=0):
+    """Generate paths of pathCount files of a synthetic tree, which are not hidden or ignored
+    """
+    paths = []
+    for relPath, isDir in _treeEntries(seed):
+        if not isDir and not os.path.basename(relPath).startswith('.') and not relPath.endswith('.pyc'):
+            paths.append(relPath)
+            if len(paths) == pathCount:
+                break
+    return paths
+
+
+def _randomFile(root, rnd):
+    """Walk down from root to a random not hidden file. Returns path relative to root
+    """
+    relPath = ''
+    while True:
+        listing = dirlisting.scan(os.path.join(root, relPath))
+        entries = [(name, flags) for name, flags in zip(listing.names, listing.dirFlags) \
+                        if not name.startswith('.') and not name.endswith('.pyc')]
+        files = [name for name, flags in entries if not flags]
+        dirs = [name for name, flags in entries if flags]
+        if files and (not dirs or rnd.random() < 0.3):
+            return os.path.join(relPath, rnd.choice(files))
+        elif dirs:
+            relPath = os.path.join(relPath, rnd.choice(dirs))
+        else:  # empty directory, start again
+            relPath = ''
+
+
+def sessions(root, kinds, count, seed=0):
+    """Generate typing sessions. Every session is a list of texts, one per keystroke
+    """
+    rnd = random.Random(seed)
+    result = []
+    for index in range(count):
+        target = _randomFile(root, rnd)
+        for kind in kinds:
+            if kind == 'open':
+                prefix = 'f ' + os.path.join(root, '')
+                result.append([prefix + target[:length] for length in range(len(target) + 1)])
+            elif kind == 'glob':
+                name = os.path.basename(target)
+                query = 'f ' + os.path.join(root, '**', '')
+                result.append([query + name[:length] + '*' for length in range(1, len(name) + 1)])
+            elif kind == 'goto':
+                result.append(gotoSession(target))
+    return result
+
+
+def gotoSession(target):
+    """Typing session of a fuzzy query for the target path
+    """
+    query = ''.join([char for char in target if char.isalnum()])[::3]
+    return ['g ' + query[:length] for length in range(len(query) + 1)]
+
+
+class _Gui:
+    """Model and delegate stages. Require QApplication
+    """
+    def __init__(self):
+        from PyQt4.QtCore import QModelIndex, QRect
+        from PyQt4.QtGui import QApplication, QImage, QPainter, QStyleOptionViewItemV4
+        from htmldelegate import HTMLDelegate
+        from locator import _CompleterModel
+
+        self._QModelIndex = QModelIndex
+        self._QRect = QRect
+        self._QPainter = QPainter
+        self._QStyleOptionViewItemV4 = QStyleOptionViewItemV4
+        self._app = QApplication(sys.argv)
+        self._model = _CompleterModel()
+        self._delegate = HTMLDelegate()
+        self._delegate.fastSizeHint = True
+        self._image = QImage(800, 20 * VISIBLE_ROWS, QImage.Format_ARGB32)
+
+    def setCompleter(self, completer):
+        self._model.setCompleter(completer)
+
+    def paint(self, rowCount):
+        painter = self._QPainter(self._image)
+        try:
+            for row in range(rowCount):
+                for column in range(self._model.completer.columnCount()):
+                    option = self._QStyleOptionViewItemV4()
+                    option.rect = self._QRect(column * 400, row * 20, 400, 20)
+                    index = self._model.index(row, column, self._QModelIndex())
+                    self._delegate.paint(painter, option, index)
+        finally:
+            painter.end()
+
+
+def replay(core, session, timings, gui=None, timeout=60.):
+    """Replay one session. Append stage durations in milliseconds to timings
+    """
+    clock = time.time
+    for text in session:
+        pos = len(text)
+        times = {}
+
+        start = clock()
+        command = core.parseCommand(text)
+        times['parse'] = clock() - start
+        if command is None:
+            continue
+
+        stageStart = clock()
+        completer = command.completer(text, pos)
+        times['completer'] = clock() - stageStart
+        if completer is None:
+            continue
+
+        stageStart = clock()
+        completer.wait(timeout)
+        times['wait'] = clock() - stageStart
+
+        stageStart = clock()
+        completer.inline()
+        times['inline'] = clock() - stageStart
+
+        visibleRows = min(completer.rowCount(), VISIBLE_ROWS)
+        stageStart = clock()
+        for row in range(visibleRows):
+            for column in range(completer.columnCount()):
+                completer.text(row, column)
+        times['rows'] = clock() - stageStart
+
+        if gui is not None:
+            stageStart = clock()
+            gui.setCompleter(completer)
+            times['model'] = clock() - stageStart
+
+            stageStart = clock()
+            gui.paint(visibleRows)
+            times['paint'] = clock() - stageStart
+
+        times['total'] = clock() - start
+
+        if isinstance(completer, FuzzyFileCompleter):
+            stageStart = clock()
+            completer.matchedFiles(timeout)
+            times['finish'] = clock() - stageStart
+
+        for stage, duration in times.items():
+            timings.setdefault(stage, []).append(duration * 1000.)
+
+
+def percentile(values, fraction):
+    """Nearest rank percentile of not empty list
+    """
+    values = sorted(values)
+    index = int(math.ceil(fraction * len(values))) - 1
+    return values[max(0, index)]
+
+
+def report(tree, kind, timings):
+    """Print percentiles table for one tree and session kind
+    """
+    print '%s, %s sessions, %d keystrokes' % (tree, kind, len(timings.get('total', [])))
+    print '  %-10s %10s %10s %10s' % ('stage', 'p50, ms', 'p99, ms', 'max, ms')
+    for stage in STAGES:
+        values = timings.get(stage)
+        if values:
+            print '  %-10s %10.2f %10.2f %10.2f' % \
+                    (stage, percentile(values, 0.5), percentile(values, 0.99), max(values))
+    print
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay typing sessions over synthetic trees')
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help='comma separated entry counts of the trees')
+    parser.add_argument('--kinds', default='open,glob,goto', help='comma separated session kinds')
+    parser.add_argument('--paths', type=int, default=500000,
+                        help='count of the indexed files for goto sessions over a generated index. 0 to skip')
+    parser.add_argument('--sessions', type=int, default=20, help='count of sessions of every kind')
+    parser.add_argument('--cold', action='store_true', help='drop directory listing cache before every session')
+    parser.add_argument('--gui', action='store_true', help='measure model and delegate. Requires X display')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for trees and sessions')
+    args = parser.parse_args()
+
+    gui = _Gui() if args.gui else None
+    kinds = args.kinds.split(',')
+
+    core = LocatorCore()
+    core.addCommandClass(CommandGotoLine)
+    core.addCommandClass(CommandOpen)
+    core.addCommandClass(CommandSaveAs)
+    core.addCommandClass(CommandGotoFile)
+
+    # saved indexes of the synthetic trees must not pollute the user cache
+    cacheDir = tempfile.mkdtemp(prefix='locator-benchmark-cache-')
+    os.environ['XDG_CACHE_HOME'] = cacheDir
+    try:
+        _run(core, args, kinds, gui)
+    finally:
+        shutil.rmtree(cacheDir, ignore_errors=True)
+
+    return 0
+
+
+def _run(core, args, kinds, gui):
+    """Generate trees and replay sessions for every size
+    """
+    for entryCount in [int(size) for size in args.sizes.split(',')]:
+        root = treeRoot(entryCount)
+        start = time.time()
+        generateTree(root, entryCount, args.seed)
+        print 'Tree %s is ready in %.1f s' % (root, time.time() - start)
+
+        if 'goto' in kinds:
+            CommandGotoFile.projectRoot = root
+            start = time.time()
+            fileindex.projectIndex(root)
+            fileindex.waitProjectIndex(root, None)
+            print 'Index is ready in %.1f s' % (time.time() - start)
+        print
+
+        allSessions = sessions(root, kinds, args.sessions, args.seed)
+        for kind in kinds:
+            timings = {}
+            for session in allSessions[kinds.index(kind)::len(kinds)]:
+                if args.cold:
+                    dirlisting.cache.clear()
+                replay(core, session, timings, gui)
+            report('%d entries' % entryCount, kind, timings)
+
+    if 'goto' in kinds and args.paths:
+        _runIndex(core, args, gui)
+
+
+def _runIndex(core, args, gui):
+    """Replay goto sessions over an index of args.paths files
+    """
+    root = os.path.join(treeRoot(0), 'index-%d' % args.paths)  # not created
+    paths = generatePaths(args.paths, args.seed)
+
+    start = time.time()
+    index = fileindex.FileIndex.fromPaths(root, paths)
+    index.save(fileindex.indexFilePath(root))
+    print 'Index of %d paths is built and saved in %.1f s' % (len(paths), time.time() - start)
+
+    CommandGotoFile.projectRoot = root
+    start = time.time()
+    fileindex.waitProjectIndex(root, None)
+    print 'Index is loaded in %.1f s' % (time.time() - start)
+    print
+
+    rnd = random.Random(args.seed)
+    timings = {}
+    for session in range(args.sessions):
+        replay(core, gotoSession(rnd.choice(paths)), timings, gui)
+    report('%d indexed paths' % len(paths), 'goto', timings)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
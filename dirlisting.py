@@ -0,0 +1,234 @@
+"""
+dirlisting --- Cached directory listings for path completers
+============================================================
+
+Process-wide cache of directory contents. Completers are created on every keystroke,
+but usually list the same directory again and again.
+
+Cached listing is validated by the directory modification time, which changes,
+when an entry is created, removed or renamed. Cache size is limited by total count of entries,
+least recently used listings are evicted
+"""
+
+import bisect
+import os
+import os.path
+import threading
+
+from collections import OrderedDict
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir  # backport for Python 2. https://pypi.python.org/pypi/scandir
+    except ImportError:
+        scandir = None
+
+
+"""Bits of Listing.dirFlags
+"""
+DIR = 1
+LINK = 2  # set for symlinks to directories
+
+
+class Listing:
+    """Contents of a directory.
+
+    names is sorted list of entry names. dirFlags is bytearray of DIR and LINK bits,
+    or _LazyDirFlags, if scandir is not available. Not zero flags mark a directory
+    """
+    def __init__(self, path, mtime, names, dirFlags):
+        self.path = path
+        self.mtime = mtime
+        self.names = names
+        self.dirFlags = dirFlags
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefixRange(self, prefix):
+        """Get (start, end) range of indexes of the names, which start with prefix
+        """
+        start = bisect.bisect_left(self.names, prefix)
+        end = start
+        count = len(self.names)
+        while end < count and self.names[end].startswith(prefix):
+            end += 1
+        return (start, end)
+
+    def isDir(self, name):
+        """Check if entry is a directory. Returns None, if there is no such entry
+        """
+        index = bisect.bisect_left(self.names, name)
+        if index < len(self.names) and self.names[index] == name:
+            return bool(self.dirFlags[index])
+        return None
+
+
+class _LazyDirFlags:
+    """dirFlags of a listing, scanned without scandir.
+
+    stat() per entry is slow for big directories, so type of an entry is detected on the first access,
+    and is cached. Completers access only the shown entries
+    """
+    _UNKNOWN = 0xff
+
+    def __init__(self, path, names):
+        self._path = path
+        self._names = names
+        self._flags = bytearray([self._UNKNOWN]) * len(names)
+
+    def __len__(self):
+        return len(self._flags)
+
+    def __getitem__(self, index):
+        flags = self._flags[index]
+        if flags == self._UNKNOWN:
+            entryPath = os.path.join(self._path, self._names[index])
+            flags = 0
+            if os.path.isdir(entryPath):
+                flags = DIR | (LINK if os.path.islink(entryPath) else 0)
+            self._flags[index] = flags
+        return flags
+
+    def __iter__(self):
+        for index in xrange(len(self._flags)):
+            yield self[index]
+
+
+class ListingCache:
+    """Cache of directory listings. Thread safe
+    """
+    def __init__(self, maxEntries=500000):
+        self.maxEntries = maxEntries
+        self._listings = OrderedDict()  # path: Listing. The last is most recently used
+        self._entryCount = 0
+        self._lock = threading.Lock()
+
+    def listing(self, path, isCancelled=None):
+        """Get Listing of the directory.
+
+        Raises OSError, if directory can not be listed.
+        Returns None, if isCancelled() returned True during scanning
+        """
+        mtime = os.stat(path).st_mtime
+
+        with self._lock:
+            cached = self._listings.pop(path, None)
+            if cached is not None:
+                if cached.mtime == mtime:
+                    self._listings[path] = cached
+                    return cached
+                else:
+                    self._entryCount -= len(cached)
+
+        listing = scan(path, mtime, isCancelled)
+        if listing is None:
+            return None
+
+        with self._lock:
+            replaced = self._listings.pop(path, None)  # might be scanned by other thread concurrently
+            if replaced is not None:
+                self._entryCount -= len(replaced)
+            self._listings[path] = listing
+            self._entryCount += len(listing)
+
+            while self._entryCount > self.maxEntries and len(self._listings) > 1:
+                evictedPath, evicted = self._listings.popitem(last=False)
+                self._entryCount -= len(evicted)
+
+        return listing
+
+    def cached(self, path):
+        """Get cached Listing of the directory or None. Directory is not scanned or validated.
+        Path might have a trailing /
+        """
+        with self._lock:
+            for key in (path.rstrip('/') or '/', os.path.join(path, '')):
+                if key in self._listings:
+                    return self._listings[key]
+        return None
+
+    def clear(self):
+        """Drop all cached listings
+        """
+        with self._lock:
+            self._listings.clear()
+            self._entryCount = 0
+
+
+# global object. Shared by all completers
+cache = ListingCache()
+
+
+def listDirectory(path, isCancelled=None):
+    """Get Listing of the directory from the global cache. See ListingCache.listing()
+    """
+    return cache.listing(path, isCancelled)
+
+
+def cachedListing(path):
+    """Get cached Listing of the directory from the global cache or None. See ListingCache.cached()
+    """
+    return cache.cached(path)
+
+
+def isDir(path):
+    """Check if path is a directory. Uses cached listing of the parent directory
+    """
+    parent, name = os.path.split(path.rstrip('/'))
+    try:
+        listing = listDirectory(parent or '.')
+    except OSError:
+        listing = None
+
+    if listing is not None:
+        flag = listing.isDir(name)
+        if flag is not None:
+            return flag
+
+    return os.path.isdir(path)
+
+
+def scan(path, mtime=None, isCancelled=None):
+    """List the directory and detect type of entries. Does not use the cache.
+
+    Without scandir type of entries is detected lazily, see _LazyDirFlags.
+
+    Raises OSError, if directory can not be listed.
+    Returns None, if isCancelled() returned True during scanning
+    """
+    if mtime is None:
+        mtime = os.stat(path).st_mtime
+
+    if scandir is not None:
+        return _scanWithDirEntries(path, mtime, isCancelled)
+
+    names = os.listdir(path)
+    names.sort()
+    return Listing(path, mtime, names, _LazyDirFlags(path, names))
+
+
+def _scanWithDirEntries(path, mtime, isCancelled):
+    """List the directory with scandir.
+
+    Type of entries is taken from the directory itself (d_type). stat() is called only,
+    if type is unknown for the file system, or entry is a symlink
+    """
+    entries = []
+    for entry in scandir(path):
+        if isCancelled is not None and isCancelled():
+            return None
+        try:
+            flags = DIR if entry.is_dir() else 0
+        except OSError:  # entry removed
+            flags = 0
+        if flags and entry.is_symlink():
+            flags |= LINK
+        entries.append((entry.name, flags))
+
+    entries.sort()
+    names = [name for name, flags in entries]
+    dirFlags = bytearray([flags for name, flags in entries])
+    return Listing(path, mtime, names, dirFlags)
@@ -0,0 +1,871 @@
+"""
+fileindex --- Index of project files for fuzzy matching
+=======================================================
+
+Keeps paths of all files under a project root and ranks them for a fuzzy query.
+Query matches a path, if all query chars are found in the path in the same order.
+Paths are searched in the order of decreasing upper bound of the score, see _Prefilter,
+so the best matches are found without scoring all the paths.
+Search tables are built together with the index and saved with it.
+
+Index is saved to the cache directory. On the next start it is memory-mapped and usable immediately,
+and is refreshed in the background. Only the directories, which modification time has changed, are rescanned.
+
+File format. All numbers are little endian::
+
+    magic 'CMPLIDX3'
+    table of sections: (offset, size) pairs of 8 byte integers in the order of _SECTIONS
+    sections, aligned to mmap.ALLOCATIONGRANULARITY:
+        root        project root
+        offsets     4 byte offsets of the paths in the blob
+        blob        paths, relative to the root, each is terminated with '\\n'. Sorted by length, then by name
+        lowerBlob   lower case copy of the blob
+        dirs        directories, relative to the root, separated with '\\n'. Root is ''
+        dirMtimes   8 byte float modification times of the dirs
+        alphabet    chars of the paths
+        charBitsets bitsets of _Prefilter for every char of the alphabet, big endian
+        pairBitsets bitsets of _Prefilter for every bucket of pairs of chars, big endian
+"""
+
+import audioop
+import binascii
+import hashlib
+import heapq
+import mmap
+import os
+import os.path
+import re
+import string
+import struct
+import sys
+import threading
+import time
+
+from array import array
+from bisect import bisect_right
+
+import dirlisting
+import ignore
+
+
+_MAGIC = 'CMPLIDX3'
+_SECTIONS = ('root', 'offsets', 'blob', 'lowerBlob', 'dirs', 'dirMtimes',
+             'alphabet', 'charBitsets', 'pairBitsets')
+_SECTION_TABLE = struct.Struct('<' + 'QQ' * len(_SECTIONS))
+
+
+def _joinPath(relDir, name):
+    """Join path, relative to the root. Root is ''
+    """
+    if relDir:
+        return relDir + '/' + name
+    else:
+        return name
+
+
+def _splitPath(path):
+    """Split path, relative to the root, to the directory and the name. Root is ''
+    """
+    slashIndex = path.rfind('/')
+    return (path[:max(slashIndex, 0)], path[slashIndex + 1:])
+
+
+def _littleEndian(arr):
+    """Convert array from or to the little endian byte order in place
+    """
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr
+
+
+_IDENTITY = string.maketrans('', '')
+_BINARY_DIGITS = string.maketrans('\x01\x02\n', '110')
+
+
+def _lineBitsets(text, chars, chunkSize=1 << 20):
+    """Get dictionary {char: bitset of the lines of text, which contain char}. Every line of text is terminated
+    with '\\n'. Bit i of a bitset is 1, if line i contains the char.
+
+    Text is filtered for halves of chars recursively, so a char is searched only among the chars of its half.
+    Text is processed by chunks of lines, so other threads are not blocked for long
+    """
+    bitsets = dict([(char, 0L) for char in chars])
+    lineIndex = 0
+    start = 0
+    while start < len(text):
+        end = text.find('\n', min(start + chunkSize, len(text) - 1)) + 1
+        pending = [(text[start:end], chars)]
+        while pending:
+            part, partChars = pending.pop()
+            part = part.translate(_IDENTITY, _IDENTITY.translate(None, partChars + '\n'))
+            if len(partChars) > 1:
+                half = len(partChars) // 2
+                pending.extend([(part, partChars[:half]), (part, partChars[half:])])
+            else:
+                # only the char and '\\n' are left, the char before '\\n' marks a line, which contains it
+                mark = '\x02' if partChars == '\x01' else '\x01'
+                digits = part.replace(partChars + '\n', mark).translate(_BINARY_DIGITS, partChars)
+                bitsets[partChars] |= long(digits[::-1], 2) << lineIndex
+        lineIndex += text.count('\n', start, end)
+        start = end
+    return bitsets
+
+
+def _alphabet(lowerBlob):
+    """Get string of the chars, which present in lowerBlob, except '\\n'
+    """
+    common = string.ascii_lowercase + string.digits + _SEPARATORS
+    rare = set(lowerBlob.translate(None, common + '\n'))
+    return ''.join([char for char in common if char in lowerBlob]) + ''.join(sorted(rare))
+
+
+def _pairHash(seed):
+    """Get translation tables (heads, tails) of a hash of pairs of chars to 127 buckets.
+
+    Bucket is a sum of the bytes of the translated head and tail, 6 bit pseudo-random values of the chars
+    """
+    values = ''.join([hashlib.md5('%s%d' % (seed, index)).digest() for index in range(32)])
+    heads = [chr(ord(value) >> 2) for value in values[:256]]
+    tails = [chr(ord(value) >> 2) for value in values[256:]]
+    heads[ord('\n')] = chr(0x90)  # -112
+    tails[ord('\n')] = chr(0x81)  # -127
+    return (''.join(heads), ''.join(tails))
+
+
+# A bucket stands for all its pairs. Pair is considered present, if its buckets of all the hashes are present
+_PAIR_HASHES = (_pairHash('heads'), _pairHash('tails'))
+_PAIR_MARKS = ''.join([chr(code) for code in range(128)]).replace('\n', '\x81') + '\x80' * 128
+_PAIR_BUCKETS = _PAIR_MARKS[:128]
+
+
+def _pairBucket(pair, pairHash):
+    """Get index of the bucket of a pair of chars
+    """
+    heads, tails = pairHash
+    return ord(heads[ord(pair[0])]) + ord(tails[ord(pair[1])])
+
+
+def _pairBlob(lowerBlob, pairHash, chunkSize=1 << 20):
+    """Replace every char of the lines with the bucket of the pair, which it starts, see _PAIR_BUCKETS.
+    The last char of a line is replaced with '\\x80'. Text is processed by chunks of lines.
+
+    Buckets of all the pairs are calculated with one audioop.add() of the signed bytes. '\\n' makes the sums
+    negative, they are replaced with '\\x80', and the second mark of the line end is the line separator.
+    Bucket 10 is renamed to '\\x81'
+    """
+    heads, tails = pairHash
+    parts = []
+    start = 0
+    while start < len(lowerBlob):
+        end = lowerBlob.find('\n', min(start + chunkSize, len(lowerBlob) - 1)) + 1
+        chunk = lowerBlob[start:end]
+        sums = audioop.add(chunk.translate(heads), (chunk[1:] + '\x00').translate(tails), 1)
+        parts.append(sums.translate(_PAIR_MARKS).replace('\x80\x80', '\x80\n'))
+        start = end
+    return ''.join(parts)
+
+
+_DIRECTORIES = re.compile(r'[^\n]*/')
+_PARENT_DIRECTORIES = re.compile(r'[^\n]*(?=/)')  # keeps the separator before the name
+_NOT_WORD_STARTS = re.compile(r'(?<=[^/_\-. \nA-Z])[^/_\-. \nA-Z]+|(?<=[^/_\-. \n])[/_\-. ]')
+
+
+def _removeFromLines(regExp, text, chunkSize=1 << 20):
+    """Remove matches of regExp from text. Every line of text is terminated with '\\n'.
+
+    Text is processed by chunks of lines, so other threads are not blocked for long
+    """
+    parts = []
+    start = 0
+    while start < len(text):
+        end = text.find('\n', min(start + chunkSize, len(text) - 1)) + 1
+        parts.append(regExp.sub('', text[start:end]))
+        start = end
+    return ''.join(parts)
+
+
+def _bitIndexes(bitset, chunkBits=1024):
+    """Generate indexes of the set bits in the increasing order.
+
+    Bitset is split to halves, so empty parts are skipped without shifting the whole bitset
+    """
+    pending = [(bitset, 0, bitset.bit_length())]
+    while pending:
+        bitset, offset, size = pending.pop()
+        if size > chunkBits:
+            half = size // 2
+            high = bitset >> half
+            low = bitset ^ (high << half)
+            if high:
+                pending.append((high, offset + half, size - half))
+            if low:
+                pending.append((low, offset, half))
+        else:
+            while bitset:
+                lowest = bitset & -bitset
+                yield offset + lowest.bit_length() - 1
+                bitset ^= lowest
+
+
+class _Prefilter:
+    """Upper bounds of the scores of the paths for a query. See score().
+
+    Every query char gets at most 2 for a match in the file name, 2 for a match at a word start
+    and 3, if it follows the previous char. A following char is in the name only, if the pair is in the name,
+    and is at a word start only after a separator or, if it is upper case. So the bound of a char is the bigger of::
+
+        3 + 2 * pairInName + 2 * pairAtWordStart        if the path contains the pair of the previous and this char
+        2 * (inName or atWordStart) + 2 * atWordStartInName
+
+    Chars after a char, matched in the name, are in the name too. So only the chars of the longest suffix
+    of the query, which chars are in the name, get the name bonuses.
+
+    For every char the index keeps bitsets of the paths, which contain the char, contain it in the name,
+    at a word start, at a word start in the name and contain the upper case char. Bit i is path i.
+    For the pairs of chars it keeps bitsets of the paths, which contain a pair of a bucket, and contain it
+    in the name, for the buckets of two hashes of the pairs. The separator before the name and the first char
+    of the name are a pair in the name. Collisions only make the bound less tight.
+    Word starts are found roughly, every upper case char is considered a word start.
+
+    Bounds + 1 are summed with bitwise long arithmetic, which processes all the paths at once:
+    bit k of the sum for path i is bit i of plane k. The sums with and without the name bonuses are kept
+    for the prefixes of the last query, so typing a char adds only this char.
+    Bitsets are stored as strings, which might be memory-mapped, and are parsed on the first use
+    """
+
+    """Planes of the sum overflow on longer queries, the rest of the chars is filtered only by presence
+    """
+    maxBoundedQueryLength = 32
+
+    _CHAR_FLAGS = 5  # has, inName, atWordStart, atNameWordStart, hasUpper
+    _PAIR_FLAGS = 2  # has, inName
+
+    def __init__(self, count, alphabet, charBitsets, pairBitsets):
+        self._size = (count + 7) // 8  # of a bitset in bytes
+        self._all = (1 << count) - 1
+        self.alphabet = alphabet
+        self._charIndexes = dict([(char, index) for index, char in enumerate(alphabet)])
+        self.charBitsets = charBitsets  # _CHAR_FLAGS bitsets for every char of the alphabet
+        self.pairBitsets = pairBitsets  # _PAIR_FLAGS bitsets for every bucket of every hash of _PAIR_HASHES
+        self._parsed = {}  # (is pair, index of a bitset): long
+        self._lastSums = ('', [])  # query, [(present, planes, planes without name bonuses) for every prefix]
+
+    @staticmethod
+    def build(blob, lowerBlob, count):
+        """Calculate the bitsets. Takes a few seconds for 500000 paths
+        """
+        blob = blob[:]  # translate() needs str, blobs might be memory-mapped
+        lowerBlob = lowerBlob[:]
+        size = (count + 7) // 8
+
+        def pack(bitset):
+            return binascii.unhexlify('%0*x' % (2 * size, bitset))
+
+        alphabet = _alphabet(lowerBlob)
+        names = _removeFromLines(_DIRECTORIES, blob)
+        lowerNames = names.lower()
+        pairNames = _removeFromLines(_PARENT_DIRECTORIES, lowerBlob)
+        upperChars = ''.join([char.upper() for char in alphabet if char.upper() != char])
+        charTexts = ((lowerBlob, alphabet),
+                     (lowerNames, alphabet),
+                     (_removeFromLines(_NOT_WORD_STARTS, blob).lower(), alphabet),
+                     (_removeFromLines(_NOT_WORD_STARTS, names).lower(), alphabet),
+                     (blob.translate(_IDENTITY, _IDENTITY.translate(None, upperChars + '\n')), upperChars))
+        charFlags = [_lineBitsets(text, chars) for text, chars in charTexts]
+        charBitsets = ''.join([pack(flags.get(char, flags.get(char.upper(), 0L))) \
+                                for char in alphabet \
+                                    for flags in charFlags])
+
+        pairBitsets = []
+        for pairHash in _PAIR_HASHES:
+            pairFlags = [_lineBitsets(_pairBlob(text, pairHash), _PAIR_BUCKETS) for text in (lowerBlob, pairNames)]
+            pairBitsets.extend([pack(flags[bucket]) \
+                                    for bucket in _PAIR_BUCKETS \
+                                        for flags in pairFlags])
+        pairBitsets = ''.join(pairBitsets)
+        return _Prefilter(count, alphabet, charBitsets, pairBitsets)
+
+    def _bitsets(self, table, index, count):
+        """Get count parsed bitsets of the table, starting from index
+        """
+        bitsets = []
+        for bitsetIndex in range(index, index + count):
+            key = (table is self.pairBitsets, bitsetIndex)
+            bitset = self._parsed.get(key)
+            if bitset is None:
+                offset = bitsetIndex * self._size
+                bitset = long(binascii.hexlify(table[offset:offset + self._size]) or '0', 16)
+                self._parsed[key] = bitset
+            bitsets.append(bitset)
+        return bitsets
+
+    def _charBitsets(self, char):
+        """Get _CHAR_FLAGS bitsets of a char. None, if no path contains it
+        """
+        index = self._charIndexes.get(char)
+        if index is None:
+            return None
+        return self._bitsets(self.charBitsets, index * self._CHAR_FLAGS, self._CHAR_FLAGS)
+
+    @staticmethod
+    def _add(planes, bits):
+        """Add bits of the numbers to the planes of the sums
+        """
+        summed = []
+        carry = 0L
+        for plane in range(max(len(planes), len(bits)) + 1):
+            a = planes[plane] if plane < len(planes) else 0L
+            b = bits[plane] if plane < len(bits) else 0L
+            if not (b or carry):
+                summed.extend(planes[plane:])
+                break
+            summed.append(a ^ b ^ carry)
+            carry = (a & b) | (carry & (a ^ b))
+        return summed
+
+    def _addChar(self, sums, lowerQuery, index):
+        """Add bound + 1 of lowerQuery[index] to the sums of the previous chars
+        """
+        bitsets = self._charBitsets(lowerQuery[index])
+        if bitsets is None:
+            return (0L, [], [])
+        has, inName, atWordStart, atNameWordStart, hasUpper = bitsets
+        all = self._all
+        if sums is None:
+            present, planes, outOfNamePlanes = has, [], []
+        else:
+            present, planes, outOfNamePlanes = sums
+            present &= has
+
+        if index:
+            pair = lowerQuery[index - 1:index + 1]
+            pairs = pairsInName = all
+            for hashIndex, pairHash in enumerate(_PAIR_HASHES):
+                bucketIndex = hashIndex * len(_PAIR_BUCKETS) + _pairBucket(pair, pairHash)
+                bucketPairs, bucketPairsInName = self._bitsets(self.pairBitsets, bucketIndex * self._PAIR_FLAGS,
+                                                               self._PAIR_FLAGS)
+                pairs &= bucketPairs
+                pairsInName &= bucketPairsInName
+            pairsInName &= pairs
+            pairsAtWordStart = pairs if pair[0] in _SEPARATORS else pairs & hasUpper
+        else:
+            pairs = pairsInName = pairsAtWordStart = 0L
+
+        # bound + 1 is 8 or 6 for the strong pairs, 5 or 4 for the weak pairs, 5, 3 or 1 for the others
+        strongPairs = pairsInName | pairsAtWordStart
+        bestPairs = pairsInName & pairsAtWordStart
+        goodPairs = strongPairs ^ bestPairs
+        weakPairs = pairs ^ strongPairs
+        others = pairs ^ all
+        bits = ((weakPairs & atNameWordStart) | others,
+                goodPairs | (others & (inName | atWordStart) & (atNameWordStart ^ all)),
+                goodPairs | weakPairs | (others & atNameWordStart),
+                bestPairs)
+        # out of the name it is 6 or 4 for the pairs, 3 or 1 for the others
+        outOfNameBits = (others,
+                         pairsAtWordStart | (others & atWordStart),
+                         pairs)
+
+        outOfNamePlanes = self._add(outOfNamePlanes, outOfNameBits)
+        planes = self._add(planes, bits)
+        notInName = inName ^ all
+        planeCount = max(len(planes), len(outOfNamePlanes))
+        planes = [(plane & inName) | (outOfNamePlane & notInName) \
+                    for plane, outOfNamePlane in zip(planes + [0L] * (planeCount - len(planes)),
+                                                     outOfNamePlanes + [0L] * (planeCount - len(outOfNamePlanes)))]
+        return (present, planes, outOfNamePlanes)
+
+    def _sums(self, lowerQuery):
+        """Get (present, planes, planes without name bonuses) for lowerQuery.
+        Sums of the common prefix with the last query are reused
+        """
+        lastQuery, lastSums = self._lastSums
+        common = 0
+        while common < min(len(lowerQuery), len(lastSums)) and lastQuery[common] == lowerQuery[common]:
+            common += 1
+        sums = lastSums[:common]
+        for index in range(common, len(lowerQuery)):
+            sums.append(self._addChar(sums[-1] if sums else None, lowerQuery, index))
+        self._lastSums = (lowerQuery, sums)
+        return sums[-1]
+
+    def tiers(self, lowerQuery):
+        """Generate (bound of the score bonuses, bitset of the paths) for the paths, which contain all the chars
+        of the query, in the order of decreasing bound
+        """
+        boundedQuery = lowerQuery[:self.maxBoundedQueryLength]
+        present, planes, outOfNamePlanes = self._sums(boundedQuery)
+        extraChars = lowerQuery[len(boundedQuery):]
+        for char in extraChars:
+            bitsets = self._charBitsets(char)
+            present &= bitsets[0] if bitsets is not None else 0L
+
+        while present:
+            members = present
+            key = 0
+            for plane in range(len(planes) - 1, -1, -1):
+                selected = members & planes[plane]
+                if selected:
+                    members = selected
+                    key |= 1 << plane
+            yield (key - len(boundedQuery) + 7 * len(extraChars), members)
+            present ^= members
+
+
+class FileIndex:
+    """Paths of files, relative to the root.
+
+    Paths are stored in one string, separated with '\\n', and an array of offsets of the paths.
+    Paths are sorted by length, so the shortest paths with the same bound are scored first.
+    The strings might be memory-mapped files
+    """
+
+    def __init__(self, root, blob, offsets, dirMtimes, lowerBlob=None, prefilter=None):
+        self.root = root
+        self._blob = blob
+        if lowerBlob is None:
+            lowerBlob = blob.lower()
+        self._lowerBlob = lowerBlob
+        self._offsets = offsets
+        self._dirMtimes = dirMtimes  # relative directory path: mtime. Or function, which loads it
+        self._prefilter = prefilter  # _Prefilter, created on first use
+        self._prefilterLock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def path(self, index):
+        """Get relative path by index
+        """
+        start = self._offsets[index]
+        return self._blob[start:self._blob.find('\n', start)]
+
+    def indexOf(self, offset):
+        """Get index of the path, which contains offset in the blob
+        """
+        return bisect_right(self._offsets, offset) - 1
+
+    def dirMtimes(self):
+        """Get dictionary {directory path, relative to the root: modification time}
+        """
+        if callable(self._dirMtimes):
+            self._dirMtimes = self._dirMtimes()
+        return self._dirMtimes
+
+    @staticmethod
+    def build(root, isCancelled=None):
+        """Walk the tree and build the index. Hidden and ignored entries are skipped.
+
+        Returns None, if cancelled
+        """
+        dirMtimes = {}
+        filesByDir = {}
+        if not FileIndex._walkInto(root, '', dirMtimes, filesByDir, isCancelled):
+            return None
+        return FileIndex._fromTree(root, dirMtimes, filesByDir)
+
+    def refreshed(self, isCancelled=None):
+        """Rescan directories, which modification time has changed.
+
+        Returns updated FileIndex, self, if nothing has changed, or None, if cancelled
+        """
+        dirMtimes = dict(self.dirMtimes())
+        changed = []
+        for relDir, mtime in dirMtimes.iteritems():
+            if isCancelled is not None and isCancelled():
+                return None
+            try:
+                currentMtime = os.stat(os.path.join(self.root, relDir)).st_mtime
+            except OSError:
+                currentMtime = None
+            if currentMtime != mtime:
+                changed.append(relDir)
+
+        if not changed:
+            return self
+
+        filesByDir = {}
+        for path in self._blob[:].split('\n')[:-1]:
+            relDir, name = _splitPath(path)
+            filesByDir.setdefault(relDir, []).append(name)
+
+        subDirs = {}
+        for relDir in dirMtimes:
+            if relDir:
+                subDirs.setdefault(_splitPath(relDir)[0], []).append(relDir)
+
+        changed.sort()  # parents first
+        for relDir in changed:
+            if relDir not in dirMtimes:  # removed together with the parent
+                continue
+            listing = self._listLevel(self.root, relDir)
+            if listing is None:  # directory has been removed
+                self._removeTree(relDir, dirMtimes, filesByDir, subDirs)
+                continue
+
+            mtime, dirNames, fileNames = listing
+            dirMtimes[relDir] = mtime
+            filesByDir[relDir] = fileNames
+
+            newSubDirs = set([_joinPath(relDir, name) for name in dirNames])
+            for subDir in subDirs.get(relDir, []):
+                if subDir not in newSubDirs:
+                    self._removeTree(subDir, dirMtimes, filesByDir, subDirs)
+            for subDir in newSubDirs:
+                if subDir not in dirMtimes:
+                    if not self._walkInto(self.root, subDir, dirMtimes, filesByDir, isCancelled):
+                        return None
+
+        return FileIndex._fromTree(self.root, dirMtimes, filesByDir)
+
+    @staticmethod
+    def _removeTree(relDir, dirMtimes, filesByDir, subDirs):
+        """Remove directory and its subdirectories from the tree
+        """
+        pending = [relDir]
+        while pending:
+            current = pending.pop()
+            dirMtimes.pop(current, None)
+            filesByDir.pop(current, None)
+            pending.extend(subDirs.pop(current, []))
+
+    @staticmethod
+    def _listLevel(root, relDir):
+        """List one directory. Returns (mtime, dirNames, fileNames) or None, if failed.
+
+        Hidden and ignored entries, and symlinks to directories are skipped
+        """
+        try:
+            listing = dirlisting.scan(os.path.join(root, relDir))
+        except OSError:
+            return None
+
+        dirNames = []
+        fileNames = []
+        matcher = ignore.matcherForDirectory(listing.path)
+        for name, flags in zip(listing.names, listing.dirFlags):
+            if matcher.isIgnored(name, bool(flags)):
+                continue
+            if not flags:
+                fileNames.append(name)
+            elif not flags & dirlisting.LINK:
+                dirNames.append(name)
+        return (listing.mtime, dirNames, fileNames)
+
+    @staticmethod
+    def _walkInto(root, relDir, dirMtimes, filesByDir, isCancelled):
+        """Add directory and its subtree to the tree. Returns False, if cancelled
+        """
+        pending = [relDir]
+        while pending:
+            if isCancelled is not None and isCancelled():
+                return False
+            current = pending.pop()
+            listing = FileIndex._listLevel(root, current)
+            if listing is None:
+                continue
+            mtime, dirNames, fileNames = listing
+            dirMtimes[current] = mtime
+            filesByDir[current] = fileNames
+            pending.extend([_joinPath(current, name) for name in dirNames])
+        return True
+
+    @staticmethod
+    def _fromTree(root, dirMtimes, filesByDir):
+        """Create index from the scanned tree
+        """
+        paths = []
+        for relDir, fileNames in filesByDir.iteritems():
+            paths.extend([_joinPath(relDir, name) for name in fileNames])
+        return FileIndex.fromPaths(root, paths, dirMtimes)
+
+    @staticmethod
+    def fromPaths(root, paths, dirMtimes=None):
+        """Create index of paths, relative to the root. Index without directory modification times
+        is never refreshed
+        """
+        paths = sorted(paths, key=lambda path: (len(path), path))
+
+        offsets = array('I')
+        offset = 0
+        for path in paths:
+            offsets.append(offset)
+            offset += len(path) + 1
+        blob = ''.join([path + '\n' for path in paths])
+        return FileIndex(root, blob, offsets, dirMtimes or {})
+
+    def save(self, filePath):
+        """Save the index. File is replaced atomically
+        """
+        dirs = sorted(self.dirMtimes().keys())
+        prefilter = self.prepareSearch()
+        sections = {'root': self.root,
+                    'offsets': _littleEndian(array('I', self._offsets)).tostring(),
+                    'blob': self._blob[:],
+                    'lowerBlob': self._lowerBlob[:],
+                    'dirs': '\n'.join(dirs),
+                    'dirMtimes': _littleEndian(array('d', [self.dirMtimes()[relDir] for relDir in dirs])).tostring(),
+                    'alphabet': prefilter.alphabet,
+                    'charBitsets': prefilter.charBitsets[:],
+                    'pairBitsets': prefilter.pairBitsets[:]}
+
+        dirPath = os.path.dirname(filePath)
+        if not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+
+        tmpPath = filePath + '.tmp%d' % os.getpid()
+        with open(tmpPath, 'wb') as f:
+            table = []
+            offset = mmap.ALLOCATIONGRANULARITY  # header fits the first block
+            for name in _SECTIONS:
+                table.extend([offset, len(sections[name])])
+                offset += -(-len(sections[name]) // mmap.ALLOCATIONGRANULARITY) * mmap.ALLOCATIONGRANULARITY
+            f.write(_MAGIC + _SECTION_TABLE.pack(*table))
+            for index, name in enumerate(_SECTIONS):
+                f.seek(table[index * 2])
+                f.write(sections[name])
+            f.truncate(offset)
+        os.rename(tmpPath, filePath)
+
+    @staticmethod
+    def load(root, filePath):
+        """Load the index. The blobs are memory-mapped, directories are loaded on first use.
+
+        Returns None, if file is missing or invalid
+        """
+        try:
+            with open(filePath, 'rb') as f:
+                if f.read(len(_MAGIC)) != _MAGIC:
+                    return None
+                table = _SECTION_TABLE.unpack(f.read(_SECTION_TABLE.size))
+                sections = dict([(name, (table[index * 2], table[index * 2 + 1])) \
+                                    for index, name in enumerate(_SECTIONS)])
+
+                def read(name):
+                    offset, size = sections[name]
+                    f.seek(offset)
+                    return f.read(size)
+
+                def mapSection(name):
+                    offset, size = sections[name]
+                    if size == 0:
+                        return ''
+                    return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ, offset=offset)
+
+                if read('root') != root:  # hash collision
+                    return None
+
+                offsets = array('I')
+                offsets.fromstring(read('offsets'))
+                _littleEndian(offsets)
+                blob = mapSection('blob')
+                lowerBlob = mapSection('lowerBlob')
+                prefilter = _Prefilter(len(offsets), read('alphabet'),
+                                       mapSection('charBitsets'), mapSection('pairBitsets'))
+        except (IOError, OSError, struct.error, ValueError):
+            return None
+
+        def loadDirMtimes():
+            """Read directories table on first use
+            """
+            with open(filePath, 'rb') as f:
+                dirsOffset, dirsSize = sections['dirs']
+                f.seek(dirsOffset)
+                dirs = f.read(dirsSize).split('\n')
+                mtimesOffset, mtimesSize = sections['dirMtimes']
+                f.seek(mtimesOffset)
+                mtimes = array('d')
+                mtimes.fromstring(f.read(mtimesSize))
+                _littleEndian(mtimes)
+            return dict(zip(dirs, mtimes))
+
+        return FileIndex(root, blob, offsets, loadDirMtimes, lowerBlob, prefilter)
+
+    def prepareSearch(self):
+        """Create search tables now, so the first query is not delayed. Takes a few seconds for 500000 paths.
+
+        Tables are built once, other threads wait for them
+        """
+        with self._prefilterLock:
+            if self._prefilter is None:
+                self._prefilter = _Prefilter.build(self._blob, self._lowerBlob, len(self._offsets))
+        return self._prefilter
+
+    def match(self, query, maxResults=100, isCancelled=None):
+        """Get list of (score, path, positions) for the best matching paths, best first. None, if cancelled
+        """
+        matches = []
+        for matches, finished in self.matchPortions(query, maxResults, None, isCancelled):
+            pass
+        return matches
+
+    def matchPortions(self, query, maxResults=100, firstPortionTime=None, isCancelled=None):
+        """Generate (list of (score, path, positions) for the best found matches, best first, finished)
+        after firstPortionTime seconds of the search, and when the search is finished. Generates None, if cancelled.
+
+        Candidates are scored in the order of decreasing bound of the score. Scoring stops,
+        when the bound is not better than the worst of maxResults found matches.
+        The first portion contains the best matches of the most of the queries. But the bound is loose
+        for the scattered queries, and most of the paths are scored to find their best matches
+        """
+        lowerQuery = query.lower()
+        if isinstance(lowerQuery, unicode):
+            lowerQuery = lowerQuery.encode('utf-8')  # paths are not decoded
+        if not lowerQuery or not self._offsets:
+            yield ([], True)
+            return
+
+        startTime = time.time()
+        blob = self._blob
+        offsets = self._offsets
+        best = []  # heap of the found matches, the worst is the first
+        scoredCount = 0
+        for bonusBound, members in self.prepareSearch().tiers(lowerQuery):
+            bound = bonusBound * 100
+            if len(best) == maxResults and best[0][0] >= bound:
+                break
+
+            for index in _bitIndexes(members):
+                start = offsets[index]
+                end = blob.find('\n', start)
+                if len(best) == maxResults and best[0][0] > bound - (end - start):
+                    break  # the next paths are not shorter
+                scoredCount += 1
+                if scoredCount % 100 == 0:
+                    if isCancelled is not None and isCancelled():
+                        yield None
+                        return
+                    if firstPortionTime is not None and time.time() - startTime > firstPortionTime:
+                        yield (sorted(best, reverse=True), False)
+                        firstPortionTime = None
+
+                path = blob[start:end]
+                pathScore, positions = score(path, lowerQuery)
+                if positions:  # chars might be in another order
+                    if len(best) < maxResults:
+                        heapq.heappush(best, (pathScore, path, positions))
+                    elif (pathScore, path) > best[0][:2]:
+                        heapq.heapreplace(best, (pathScore, path, positions))
+
+        best.sort(reverse=True)
+        yield (best, True)
+
+
+_SEPARATORS = '/_-. '
+
+
+def score(path, lowerQuery):
+    """Score path for a lower case query, which chars present in the path in the same order.
+
+    Returns tuple (score, positions of matched chars).
+    Matches in the file name, consecutive matches and matches at word starts get bonuses,
+    long paths get a penalty. The positions with the biggest sum of the bonuses are found,
+    on ties the later positions win, so matches gravitate to the file name
+    """
+    lowerPath = path.lower()
+    lastPositions = []  # the latest positions, which allow to match the rest of the query
+    end = len(path)
+    for char in reversed(lowerQuery):
+        end = lowerPath.rfind(char, 0, end)
+        if end == -1:  # not matching
+            return (-len(path), [])
+        lastPositions.append(end)
+    lastPositions.reverse()
+
+    nameStart = path.rfind('/') + 1
+    cells = None  # (bonuses, position, previous cell) for the occurrences of the previous char
+    first = -1
+    for char, lastPosition in zip(lowerQuery, lastPositions):
+        newCells = []
+        best = None  # the best cell of the previous char before pos
+        previousIndex = 0
+        pos = lowerPath.find(char, first + 1)
+        while pos != -1 and pos <= lastPosition:
+            bonus = 0
+            if pos >= nameStart:
+                bonus += 2
+            if pos == 0 or path[pos - 1] in _SEPARATORS or \
+               (path[pos].isupper() and path[pos - 1].islower()):
+                bonus += 2
+
+            if cells is None:
+                cell = (bonus, pos, None)
+            else:
+                while previousIndex < len(cells) and cells[previousIndex][1] < pos:
+                    if best is None or cells[previousIndex][0] >= best[0]:
+                        best = cells[previousIndex]
+                    previousIndex += 1
+                cell = (best[0] + bonus, pos, best)
+                previous = cells[previousIndex - 1]
+                if previous[1] == pos - 1 and previous[0] + 3 + bonus > cell[0]:
+                    cell = (previous[0] + 3 + bonus, pos, previous)
+            newCells.append(cell)
+            pos = lowerPath.find(char, pos + 1)
+        cells = newCells
+        first = cells[0][1]
+
+    cell = max(cells)
+    result = cell[0]
+    positions = []
+    while cell is not None:
+        positions.append(cell[1])
+        cell = cell[2]
+    positions.reverse()
+    return (result * 100 - len(path), positions)
+
+
+_indexes = {}  # root: (FileIndex or None, updating thread)
+_indexesLock = threading.Lock()
+
+
+def indexFilePath(root):
+    """Path of the saved index for the project root
+    """
+    cacheDir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cacheDir, 'completer', 'index-%s' % hashlib.md5(root).hexdigest())
+
+
+def projectIndex(root):
+    """Get FileIndex for the project root.
+
+    On first call the saved index is loaded, and updating is started in the background.
+    Returns None, if there is no saved index, and the index is not built yet
+    """
+    with _indexesLock:
+        if root not in _indexes:
+            index = FileIndex.load(root, indexFilePath(root))
+            thread = threading.Thread(target=_updateIndex, args=(root, index), name='FileIndex')
+            thread.setDaemon(True)
+            _indexes[root] = (index, thread)
+            thread.start()
+        return _indexes[root][0]
+
+
+def waitProjectIndex(root, timeout=None):
+    """Wait until index for the root is updated. Returns FileIndex or None
+    """
+    projectIndex(root)
+    _indexes[root][1].join(timeout)
+    return _indexes[root][0]
+
+
+def _updateIndex(root, index):
+    """Build index or refresh the loaded one, and save it. Called in a background thread
+    """
+    if index is None:
+        updated = FileIndex.build(root)
+    else:
+        index.prepareSearch()  # loaded index is used, while it is being refreshed
+        updated = index.refreshed()
+
+    if updated is None or updated is index:
+        return
+
+    updated.prepareSearch()
+    with _indexesLock:
+        _indexes[root] = (updated, _indexes[root][1])
+
+    try:
+        updated.save(indexFilePath(root))
+    except (IOError, OSError):  # index is saved only to speed up the next start
+        pass
@@ -0,0 +1,166 @@
+"""
+frecency --- Ranking of files by frequency and recency of opening
+=================================================================
+
+Every opening of a file adds 1 to its score. Scores decay exponentially with halfLife.
+Score is stored in log space, relative to the epoch:
+
+    value = log(sum(exp(decayRate * openingTime)))
+
+so actual score is exp(value - decayRate * now). All scores decay with the same rate,
+so they are compared by value, without recalculation, and a new opening is added with one logaddexp.
+
+Store is a text file of 'value<TAB>path' lines. New values are appended, the file is compacted
+when it contains much more lines than paths
+"""
+
+import codecs
+import heapq
+import math
+import os
+import os.path
+import threading
+import time
+
+
+def defaultFilePath():
+    """Default path of the store file
+    """
+    dataDir = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(dataDir, 'completer', 'frecency')
+
+
+def _logAddExp(a, b):
+    """log(exp(a) + exp(b)) without overflow
+    """
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+
+class FrecencyStore:
+    """Decayed scores of paths. If filePath is None, scores are not saved.
+
+    Paths are absolute. Thread safe
+    """
+    def __init__(self, filePath=None, halfLife=7 * 24 * 3600., maxEntries=10000):
+        self.filePath = filePath
+        self.maxEntries = maxEntries
+        self._decayRate = math.log(2) / halfLife
+        self._values = {}  # path: value
+        self._lineCount = 0
+        self._lock = threading.Lock()
+
+        if filePath is not None:
+            self._load()
+
+    def _load(self):
+        """Read the store file. The last value of a path wins
+        """
+        try:
+            with codecs.open(self.filePath, 'r', 'utf-8') as storeFile:
+                for line in storeFile:
+                    value, sep, path = line.rstrip('\n').partition('\t')
+                    try:
+                        self._values[path] = float(value)
+                    except ValueError:  # broken line
+                        continue
+                    self._lineCount += 1
+        except IOError:
+            pass
+
+    def value(self, path):
+        """Get log space value of the absolute path, or None, if never opened
+        """
+        return self._values.get(path)
+
+    def record(self, path, now=None):
+        """Path has been opened
+        """
+        if now is None:
+            now = time.time()
+        path = os.path.abspath(path)
+
+        with self._lock:
+            value = self._decayRate * now
+            oldValue = self._values.get(path)
+            if oldValue is not None:
+                value = _logAddExp(oldValue, value)
+            self._values[path] = value
+            self._lineCount += 1
+
+            if self.filePath is None:
+                return
+            if self._lineCount > 2 * len(self._values) + 100 or \
+               len(self._values) > self.maxEntries:
+                self._compact()
+            else:
+                try:
+                    self._ensureDirectory()
+                    with codecs.open(self.filePath, 'a', 'utf-8') as storeFile:
+                        storeFile.write('%r\t%s\n' % (value, path))
+                except IOError:
+                    pass  # ranking is not critical
+
+    def _compact(self):
+        """Keep maxEntries paths with the highest scores. Rewrite the file
+        """
+        values = dict(heapq.nlargest(self.maxEntries, self._values.iteritems(), key=lambda item: item[1]))
+        self._values = values
+        self._lineCount = len(values)
+
+        tmpPath = self.filePath + '.tmp'
+        try:
+            self._ensureDirectory()
+            with codecs.open(tmpPath, 'w', 'utf-8') as storeFile:
+                storeFile.write(''.join(['%r\t%s\n' % (value, path) for path, value in values.iteritems()]))
+            os.rename(tmpPath, self.filePath)
+        except (IOError, OSError):
+            pass
+
+    def _ensureDirectory(self):
+        dirPath = os.path.dirname(self.filePath)
+        if dirPath and not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+
+    def rank(self, paths, topK):
+        """Move up to topK paths with the highest scores to the beginning of the list.
+
+        Order of other paths is kept. Paths without score are not moved. Returns new list
+        """
+        values = self._values
+        scored = []
+        for index, path in enumerate(paths):
+            value = values.get(path if path.startswith('/') else os.path.abspath(path))
+            if value is not None:
+                scored.append((value, -index, path))
+
+        if not scored:
+            return paths
+
+        top = [path for value, index, path in heapq.nlargest(topK, scored)]
+        topSet = set(top)
+        return top + [path for path in paths if path not in topSet]
+
+    def ranked(self, isMatch):
+        """Get all stored paths, for which isMatch(path) is True, the highest score first
+        """
+        with self._lock:
+            items = self._values.items()
+        matching = [(value, path) for path, value in items if isMatch(path)]
+        matching.sort(reverse=True)
+        return [path for value, path in matching]
+
+
+_store = None
+_storeLock = threading.Lock()
+
+
+def store():
+    """Get global store. It is loaded on first use
+    """
+    global _store
+    with _storeLock:
+        if _store is None:
+            _store = FrecencyStore(defaultFilePath())
+        return _store
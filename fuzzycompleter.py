@@ -0,0 +1,138 @@
+"""
+fuzzycompleter --- Fuzzy file completer for Locator
+===================================================
+"""
+
+import os.path
+
+import fileindex
+from htmlutils import htmlEscape
+from pathcompleter import AbstractPathCompleter
+from worker import WorkerPool
+
+
+class FuzzyFileCompleter(AbstractPathCompleter):
+    """Completer, which fuzzy matches all files of the project. Matched chars are highlighted
+    
+    The best matches, found in the first portion of the search, are shown immediately.
+    The search is finished in the background, and the list is updated with its results.
+    The search generator is used only by worker threads, by one task at a time
+    
+    Used by Go to file command
+    """
+    
+    """Count of shown best matches
+    """
+    maxResults = 200
+    
+    """Time of the search before the first matches are shown. Seconds
+    """
+    firstPortionTime = 0.005
+    
+    # The search is finished here, so it does not delay the scanning of the next query
+    _finishPool = WorkerPool(1)
+    
+    def __init__(self, root, query):
+        AbstractPathCompleter.__init__(self, query)
+        self._root = root
+        self._portions = None  # generator of the portions of the search. Used by workers
+        self._rankedFiles = None  # files, found by the finished search. Set by workers
+        self._finishTask = None
+        self._startScan(self._scan)
+    
+    def _scan(self, task):
+        """Wait for the project index and match the query. Called in a worker thread
+        """
+        index = fileindex.projectIndex(self._root)
+        while index is None:
+            if task.isCancelled():
+                return None
+            index = fileindex.waitProjectIndex(self._root, 0.1)
+        
+        if not self._originalText:
+            self._rankedFiles = []
+            return ([], [], '%d files in the project. Type a part of the path' % len(index), None)
+        
+        self._portions = index.matchPortions(self._originalText, self.maxResults,
+                                             self.firstPortionTime, task.isCancelled)
+        return self._nextPortion()
+    
+    def _finish(self, task):
+        """Finish the search. Called in a worker thread.
+        
+        Search is cancelled, when the scan becomes stale
+        """
+        return self._nextPortion()
+    
+    def _nextPortion(self):
+        """Get the scanning result for the next portion of the search. None, if cancelled
+        """
+        portion = self._portions.next()
+        if portion is None:
+            return None
+        
+        matches, finished = portion
+        files = [os.path.join(self._root, path) for score, path, positions in matches]
+        if finished:
+            self._rankedFiles = files
+            status = None if files else 'No matching files'
+        else:
+            status = 'Searching for better matches...'
+        return ([], files, status, None)
+    
+    def _startFinishing(self):
+        """Start finishing the search in the background, if only its first portion has been done
+        """
+        if self._finishTask is None and self._portions is not None and self._rankedFiles is None:
+            self._finishTask = self._finishPool.submit(self._finish, self._onScanFinished)
+    
+    def applyUpdate(self):
+        """AbstractCompleter method implementation.
+        
+        Apply results of a portion of the search. Finishing is started after the first portion is applied
+        """
+        if not AbstractPathCompleter.applyUpdate(self):
+            return False
+        self._startFinishing()
+        return True
+    
+    def matchedFiles(self, timeout=None):
+        """Get absolute paths of the matching files, the best first.
+        
+        Waits for the search in the worker threads. Returns None, if it has not finished in timeout.
+        If it has been cancelled by a newer scan, the query is matched in the calling thread
+        """
+        if not self._scanTask.wait(timeout):
+            return None
+        if self._scanTask.result is not None and self._rankedFiles is None:
+            self._startFinishing()
+            if not self._finishTask.wait(timeout):
+                return None
+        if self._rankedFiles is not None:
+            return self._rankedFiles
+        
+        index = fileindex.projectIndex(self._root)
+        if index is None:
+            return None
+        matches = index.match(self._originalText, self.maxResults)
+        return [os.path.join(self._root, path) for score, path, positions in matches]
+    
+    def _headerText(self):
+        """Get text, which shall be displayed on the header
+        """
+        return self._root
+    
+    def _formatPath(self, path, isDir):
+        """Show path relative to the project root. Highlight matched chars
+        """
+        path = os.path.relpath(path, self._root)
+        score, positions = fileindex.score(path, self._originalText.lower())
+        
+        parts = []
+        prevEnd = 0
+        for pos in positions:
+            parts.append(htmlEscape(path[prevEnd:pos]))
+            parts.append('<b>%s</b>' % htmlEscape(path[pos]))
+            prevEnd = pos + 1
+        parts.append(htmlEscape(path[prevEnd:]))
+        return ''.join(parts)
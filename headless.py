@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+headless --- Locator without GUI
+================================
+
+Reads queries from stdin, one per line, and prints recognized command, inline completion
+and completion list for every query. Qt is not required. Example:
+
+    printf 'f /usr/\ng src/**/*.py\n' | python headless.py --rows 10
+"""
+
+import argparse
+import sys
+
+from htmlutils import htmlToPlainText
+from locatorcore import LocatorCore
+from workspace_commands import CommandGotoFile, CommandGotoLine, CommandOpen, CommandSaveAs
+
+
+def _rows(completer, maxRows):
+    """Get plain text rows of the completer. Loads more rows, while there are less than maxRows
+    """
+    while completer.rowCount() < maxRows and completer.canFetchMore():
+        for row, count, insert in completer.fetchMore():
+            insert()
+        completer.wait()  # rows might be loaded in the background
+
+    rows = []
+    for row in range(min(completer.rowCount(), maxRows)):
+        columns = [completer.text(row, column) or '' for column in range(completer.columnCount())]
+        rows.append('\t'.join([htmlToPlainText(column) for column in columns]))
+    return rows
+
+
+def complete(core, text, maxRows, timeout):
+    """Complete one query. Returns list of output lines
+    """
+    command, completer = core.complete(text, len(text))
+    if not completer.wait(timeout):
+        return ['> %s' % text, 'timeout']
+
+    lines = ['> %s' % text]
+    lines.append('command: %s' % (command.__class__.__name__ if command is not None else None))
+    lines.append('inline: %s' % completer.inline())
+    lines.extend(['  ' + row for row in _rows(completer, maxRows)])
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Complete Locator queries from stdin without GUI')
+    parser.add_argument('--rows', type=int, default=20, help='maximum count of printed rows per query')
+    parser.add_argument('--timeout', type=float, default=10., help='seconds to wait for background scanning')
+    args = parser.parse_args()
+
+    core = LocatorCore()
+    core.addCommandClass(CommandGotoLine)
+    core.addCommandClass(CommandOpen)
+    core.addCommandClass(CommandSaveAs)
+    core.addCommandClass(CommandGotoFile)
+
+    for line in sys.stdin:
+        text = line.rstrip('\n')
+        for outputLine in complete(core, text, args.rows, args.timeout):
+            print outputLine
+        sys.stdout.flush()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
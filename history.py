@@ -0,0 +1,279 @@
+"""
+history --- Persistent history of executed commands
+===================================================
+
+Commands are appended to a text file, one per line. The file is rewritten only on compaction,
+when it contains more than 2 * maxEntries commands. Then the latest maxEntries are kept.
+
+Reverse search uses an index of trigrams. The index is built in the background after the first search,
+so loading does not depend on it. Until it is ready, commands are searched linearly.
+
+Navigator keeps the position of Up, Down and Ctrl+R in the history
+"""
+
+import bisect
+import codecs
+import os
+import os.path
+import threading
+
+
+def defaultFilePath():
+    """Default path of the history file
+    """
+    dataDir = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(dataDir, 'completer', 'history')
+
+
+def _trigrams(text):
+    """Set of trigrams of the text
+    """
+    return set([text[index:index + 3] for index in range(len(text) - 2)])
+
+
+class History:
+    """List of executed commands. The oldest is the first.
+
+    If filePath is None, history is not saved
+    """
+    def __init__(self, filePath=None, maxEntries=10000):
+        self.filePath = filePath
+        self.maxEntries = maxEntries
+        self._entries = []
+        self._index = None  # trigram: sorted list of entry indexes. See _startIndexing()
+        self._indexing = False
+        self._lock = threading.Lock()
+
+        if filePath is not None:
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]
+
+    def _load(self):
+        """Read history file. Compact it, if too long
+        """
+        try:
+            with codecs.open(self.filePath, 'r', 'utf-8', 'replace') as historyFile:  # file might be broken
+                self._entries = historyFile.read().splitlines()
+        except IOError:
+            self._entries = []
+
+        if len(self._entries) > 2 * self.maxEntries:
+            self._compact()
+
+    def append(self, text):
+        """Add command to the end of history. Repeated command is not added
+        """
+        text = text.replace('\n', ' ').strip()
+        if not text or (self._entries and self._entries[-1] == text):
+            return
+
+        with self._lock:
+            self._entries.append(text)
+            if self._index is not None:
+                self._addToIndex(self._index, len(self._entries) - 1)
+
+        if len(self._entries) > 2 * self.maxEntries:
+            self._compact()
+        elif self.filePath is not None:
+            try:
+                self._ensureDirectory()
+                with codecs.open(self.filePath, 'a', 'utf-8') as historyFile:
+                    historyFile.write(text + '\n')
+            except IOError:
+                pass  # history is not critical
+
+    def _compact(self):
+        """Keep the latest maxEntries commands. Rewrite the file
+        """
+        with self._lock:
+            self._entries = self._entries[-self.maxEntries:]
+            self._index = None
+        if self.filePath is None:
+            return
+
+        tmpPath = self.filePath + '.tmp'
+        try:
+            self._ensureDirectory()
+            with codecs.open(tmpPath, 'w', 'utf-8') as historyFile:
+                historyFile.write(''.join([entry + '\n' for entry in self._entries]))
+            os.rename(tmpPath, self.filePath)
+        except (IOError, OSError):
+            pass
+
+    def _ensureDirectory(self):
+        dirPath = os.path.dirname(self.filePath)
+        if dirPath and not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+
+    def _addToIndex(self, index, entryIndex):
+        for trigram in _trigrams(self._entries[entryIndex]):
+            index.setdefault(trigram, []).append(entryIndex)
+
+    def _startIndexing(self):
+        """Start building the trigram index in a background thread, if not started yet
+        """
+        with self._lock:
+            if self._index is not None or self._indexing:
+                return
+            self._indexing = True
+
+        thread = threading.Thread(target=self._buildIndex, name='HistoryIndex')
+        thread.setDaemon(True)
+        thread.start()
+
+    def _buildIndex(self):
+        """Build trigram index of all entries. Thread body
+        """
+        entries = self._entries
+        count = len(entries)
+        index = {}
+        for entryIndex in xrange(count):
+            for trigram in _trigrams(entries[entryIndex]):
+                index.setdefault(trigram, []).append(entryIndex)
+
+        with self._lock:
+            self._indexing = False
+            if self._entries is not entries:  # compacted during indexing
+                return
+            for entryIndex in xrange(count, len(entries)):  # appended during indexing
+                self._addToIndex(index, entryIndex)
+            self._index = index
+
+    def search(self, query, before=None):
+        """Find the latest command, which contains query, and which index is less than before.
+
+        Returns index of the command or None. Candidates are taken from the shortest
+        list of commands, containing a trigram of the query. Short queries are searched linearly,
+        and all queries, while the index is being built
+        """
+        if before is None:
+            before = len(self._entries)
+
+        trigrams = _trigrams(query)
+        if trigrams:
+            self._startIndexing()
+        with self._lock:
+            index = self._index
+
+        if not trigrams or index is None:
+            candidates = xrange(before - 1, -1, -1)
+        else:
+            postings = [index.get(trigram, []) for trigram in trigrams]
+            shortest = min(postings, key=len)
+            end = bisect.bisect_left(shortest, before)
+            candidates = (shortest[position] for position in xrange(end - 1, -1, -1))
+
+        for entryIndex in candidates:
+            if query in self._entries[entryIndex]:
+                return entryIndex
+        return None
+
+
+class Navigator:
+    """Position in History, which is changed with Up, Down and Ctrl+R.
+
+    The position after the latest command is the command being edited. It is saved, when the user leaves it.
+    In the search mode every change of the query searches the latest command, which contains it.
+    Does not depend on GUI, methods return the text to show or None, if nothing changed
+    """
+    def __init__(self, history):
+        self.history = history
+        self.index = len(history)  # index of the shown command. len(history) for the edited command
+        self.editedCommand = ''
+        self.searchQuery = None  # query of Ctrl+R search. None, if not searching
+        self._searchStates = []  # (query, index) before every query change. For undoSearch()
+
+    def current(self):
+        """Text of the shown command
+        """
+        if self.index < len(self.history):
+            return self.history[self.index]
+        return self.editedCommand
+
+    def reset(self):
+        """Command has been executed. Return to a new empty command
+        """
+        self.stopSearch()
+        self.index = len(self.history)
+        self.editedCommand = ''
+
+    def _saveEditedCommand(self, text):
+        if self.index >= len(self.history):
+            self.index = len(self.history)
+            self.editedCommand = text
+
+    def previous(self, text):
+        """Up pressed. text is the shown text
+        """
+        self._saveEditedCommand(text)
+        if self.index > 0:
+            self.index -= 1
+            return self.current()
+        return None
+
+    def next(self):
+        """Down pressed
+        """
+        if self.index < len(self.history):
+            self.index += 1
+            return self.current()
+        return None
+
+    def startSearch(self, text):
+        """Ctrl+R pressed. text is the shown text. The query is empty
+        """
+        self._saveEditedCommand(text)
+        self.searchQuery = ''
+        self._searchStates = []
+
+    def stopSearch(self):
+        """Leave the search mode. The shown command stays
+        """
+        self.searchQuery = None
+        self._searchStates = []
+
+    def cancelSearch(self):
+        """Leave the search mode and return to the edited command
+        """
+        self.stopSearch()
+        self.index = len(self.history)
+        return self.current()
+
+    def searchOlder(self):
+        """Ctrl+R pressed in the search mode. Find older command, which contains the query.
+        Returns True, if found
+        """
+        return self._search(self.searchQuery, self.index)
+
+    def refineSearch(self, text):
+        """Text typed in the search mode. The shown command is kept, if it contains the new query.
+        Returns True, if found. The query is changed anyway, as in shells
+        """
+        return self._search(self.searchQuery + text, min(self.index + 1, len(self.history)))
+
+    def undoSearch(self):
+        """Backspace pressed in the search mode. Undo the last query or position change.
+        Returns False, if there is nothing to undo
+        """
+        if not self._searchStates:
+            return False
+        self.searchQuery, self.index = self._searchStates.pop()
+        return True
+
+    def _search(self, query, before):
+        index = self.history.search(query, before) if query else None
+        if index is None:
+            if query != self.searchQuery:
+                self._searchStates.append((self.searchQuery, self.index))
+                self.searchQuery = query
+            return False
+
+        self._searchStates.append((self.searchQuery, self.index))
+        self.searchQuery = query
+        self.index = index
+        return True
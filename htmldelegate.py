@@ -6,32 +6,49 @@ htmldelegate --- QStyledItemDelegate delegate. Draws HTML
 from PyQt4 import QtGui
 from PyQt4 import QtCore
 
-_HTML_ESCAPE_TABLE = \
-{
-    "&": "&amp;",
-    '"': "&quot;",
-    "'": "&apos;",
-    ">": "&gt;",
-    "<": "&lt;",
-    " ": "&nbsp;",
-    "\t": "&nbsp;&nbsp;&nbsp;&nbsp;",
-}
+from collections import OrderedDict
 
-def htmlEscape(text):
-    """Replace special HTML symbols with escase sequences
-    """
-    return "".join(_HTML_ESCAPE_TABLE.get(c,c) for c in text)
+import instrumentation
+from htmlutils import htmlEscape, htmlToPlainText
 
 
 class HTMLDelegate(QtGui.QStyledItemDelegate):
     """QStyledItemDelegate implementation. Draws HTML
     
     http://stackoverflow.com/questions/1956542/how-to-make-item-view-render-rich-html-text-in-qt/1956781#1956781
+    
+    Laid out documents are cached and shared by paint() and sizeHint(),
+    so the same HTML is not parsed again on every repaint
     """
     
+    """Maximum count of cached documents
+    """
+    maxCachedDocuments = 1000
+    
+    def __init__(self, *args):
+        QtGui.QStyledItemDelegate.__init__(self, *args)
+        self.fastSizeHint = False
+        self._documents = OrderedDict()  # (html, font, palette): QTextDocument. The last is most recently used
+    
+    def _document(self, options):
+        """Get laid out document for the item text
+        """
+        key = (options.text, options.font.key(), options.palette.cacheKey())
+        doc = self._documents.pop(key, None)
+        if doc is None:
+            doc = QtGui.QTextDocument()
+            doc.setDocumentMargin(1)
+            #  bad long (multiline) strings processing doc.setTextWidth(options.rect.width())
+            doc.setHtml(options.text)
+            if len(self._documents) >= self.maxCachedDocuments:
+                self._documents.popitem(last=False)
+        self._documents[key] = doc
+        return doc
+    
     def paint(self, painter, option, index):
         """QStyledItemDelegate.paint implementation
         """
+        startTime = instrumentation.start()
         option.state &= ~QtGui.QStyle.State_HasFocus  # never draw focus rect
         
         options = QtGui.QStyleOptionViewItemV4(option)
@@ -39,10 +56,7 @@ class HTMLDelegate(QtGui.QStyledItemDelegate):
 
         style = QtGui.QApplication.style() if options.widget is None else options.widget.style()
 
-        doc = QtGui.QTextDocument()
-        doc.setDocumentMargin(1)
-        doc.setHtml(options.text)
-        #  bad long (multiline) strings processing doc.setTextWidth(options.rect.width())
+        doc = self._document(options)
 
         options.text = ""
         style.drawControl(QtGui.QStyle.CE_ItemViewItem, options, painter);
@@ -60,15 +74,20 @@ class HTMLDelegate(QtGui.QStyledItemDelegate):
         doc.documentLayout().draw(painter, ctx)
 
         painter.restore()
+        instrumentation.record('paint', startTime)
 
     def sizeHint(self, option, index):
         """QStyledItemDelegate.sizeHint implementation
+        
+        If fastSizeHint is set, size is estimated with font metrics of the plain text, document is not created
         """
         options = QtGui.QStyleOptionViewItemV4(option)
         self.initStyleOption(options,index)
 
-        doc = QtGui.QTextDocument()
-        doc.setDocumentMargin(1)
-        #  bad long (multiline) strings processing doc.setTextWidth(options.rect.width())
-        doc.setHtml(options.text)
+        if self.fastSizeHint:
+            fm = QtGui.QFontMetrics(options.font)
+            margins = 2  # see QTextDocument.setDocumentMargin() call
+            return QtCore.QSize(fm.width(htmlToPlainText(options.text)) + margins, fm.height() + margins)
+
+        doc = self._document(options)
         return QtCore.QSize(doc.idealWidth(), doc.size().height())
@@ -0,0 +1,36 @@
+"""
+htmlutils --- HTML escaping for completion lists
+================================================
+
+Does not depend on Qt
+"""
+
+import re
+
+_HTML_ESCAPE_TABLE = \
+{
+    "&": "&amp;",
+    '"': "&quot;",
+    "'": "&apos;",
+    ">": "&gt;",
+    "<": "&lt;",
+    " ": "&nbsp;",
+    "\t": "&nbsp;&nbsp;&nbsp;&nbsp;",
+}
+
+def htmlEscape(text):
+    """Replace special HTML symbols with escase sequences
+    """
+    return "".join(_HTML_ESCAPE_TABLE.get(c,c) for c in text)
+
+
+_HTML_TAG_RE = re.compile('<[^>]*>')
+_HTML_ENTITY_RE = re.compile('&[a-z]+;')
+_HTML_UNESCAPE_TABLE = dict([(escaped, char) for char, escaped in _HTML_ESCAPE_TABLE.items() \
+                                if char != '\t'])  # tab is escaped as a sequence of spaces
+
+def htmlToPlainText(html):
+    """Strip tags and replace escape sequences, produced by htmlEscape()
+    """
+    text = _HTML_TAG_RE.sub('', html)
+    return _HTML_ENTITY_RE.sub(lambda match: _HTML_UNESCAPE_TABLE.get(match.group(0), match.group(0)), text)
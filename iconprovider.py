@@ -0,0 +1,45 @@
+"""
+iconprovider --- Icons for files and directories
+================================================
+
+Icons are cached by file type and extension. File system is not watched,
+icon of a file is requested once for every extension.
+
+Without Qt or QApplication there are no icons
+"""
+
+import os.path
+
+try:
+    from PyQt4.QtCore import QFileInfo
+    from PyQt4.QtGui import QApplication, QFileIconProvider
+except ImportError:  # headless mode, see locatorcore
+    QApplication = None
+
+
+_provider = None
+_dirIcon = None
+_fileIcons = {}  # extension: QIcon
+
+
+def iconForPath(path, isDir):
+    """Get icon for file or directory path. Returns None, if there is no GUI
+    """
+    global _provider, _dirIcon
+    if QApplication is None or QApplication.instance() is None:
+        return None
+
+    if _provider is None:
+        _provider = QFileIconProvider()
+
+    if isDir:
+        if _dirIcon is None:
+            _dirIcon = _provider.icon(QFileIconProvider.Folder)
+        return _dirIcon
+
+    extension = os.path.splitext(path)[1].lower()
+    icon = _fileIcons.get(extension)
+    if icon is None:
+        icon = _provider.icon(QFileInfo(path))
+        _fileIcons[extension] = icon
+    return icon
@@ -0,0 +1,318 @@
+"""
+ignore --- Rules for hidden and ignored files
+=============================================
+
+Decides, which files and directories completers and tree walkers skip.
+
+Rules have .gitignore syntax. Default rules apply everywhere, rules from .gitignore files
+apply to the directory of the file and below. The last matching rule wins, !rule re-includes a path,
+rule/ matches only directories.
+
+Rules of every file are compiled to one regular expression for directories and one for files,
+and match paths relative to the directory of the file. Matchers are cached per directory
+"""
+
+import os
+import os.path
+import re
+import threading
+import time
+
+
+"""Rules, which apply everywhere. Hidden files and compiled Python files are ignored by default
+"""
+defaultRules = ['.*', '*.pyc']
+
+"""Name of files with per directory rules
+"""
+ignoreFileName = '.gitignore'
+
+"""Cached matchers are revalidated, if they are older than this period, seconds.
+Validation stats ignore files in the directory and its parents
+"""
+validationPeriod = 2.
+
+
+def globSegmentRegExp(segment):
+    """Translate glob path segment to regular expression. Wildcards do not match /
+    """
+    parts = []
+    index = 0
+    while index < len(segment):
+        char = segment[index]
+        index += 1
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            end = segment.find(']', index + 1)
+            if end == -1:
+                parts.append('\\[')
+            else:
+                charClass = segment[index:end]
+                if charClass.startswith('!'):
+                    charClass = '^' + charClass[1:]
+                parts.append('[%s]' % charClass.replace('\\', '\\\\'))
+                index = end + 1
+        elif char == '\\' and index < len(segment):
+            parts.append(re.escape(segment[index]))
+            index += 1
+        else:
+            parts.append(re.escape(char))
+    return ''.join(parts)
+
+
+class _Rule:
+    """One parsed rule. regExp matches path, relative to the directory of the rules.
+    Not anchored rules are matched in any subdirectory
+    """
+    def __init__(self, pattern, regExp, negated, dirOnly, anchored):
+        self.pattern = pattern
+        self.regExp = regExp
+        self.negated = negated
+        self.dirOnly = dirOnly
+        self.anchored = anchored
+
+
+def parseRules(lines):
+    """Parse .gitignore lines. Returns list of _Rule
+    """
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n').rstrip('\r')
+        if not line.endswith('\\ '):
+            line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            continue
+
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\'):  # escaped leading ! or #
+            line = line[1:]
+
+        dirOnly = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+
+        anchored = '/' in line
+        line = line.lstrip('/')
+
+        segments = line.split('/')
+        parts = []
+        for index, segment in enumerate(segments):
+            isLast = index == len(segments) - 1
+            if segment == '**':
+                parts.append('.*' if isLast else '(?:.*/)?')
+            else:
+                parts.append(globSegmentRegExp(segment) + ('' if isLast else '/'))
+
+        rules.append(_Rule(line, ''.join(parts) + r'\Z', negated, dirOnly, anchored))
+
+    return rules
+
+
+def _isLiteral(text):
+    """Check if glob text contains no wildcards and escapes
+    """
+    return not any([char in text for char in '*?[\\'])
+
+
+class _RuleSet:
+    """Rules of one ignore file, or the default rules.
+
+    Rules are compiled to one regular expression for directories and one for files.
+    If no rule contains /, the set is name-only: entries are matched by name, and the set does not depend
+    on the directory. Name-only sets of literal prefixes, suffixes and names without negations,
+    like the default rules, are checked with str methods
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.nameOnly = not any([rule.anchored for rule in rules])
+        self._dirRegExp, self._dirIgnoring = self._compile(rules)
+        self._fileRegExp, self._fileIgnoring = self._compile([rule for rule in rules if not rule.dirOnly])
+        self._dirLiterals = self._literals(rules)
+        self._fileLiterals = self._literals([rule for rule in rules if not rule.dirOnly])
+
+    def _compile(self, rules):
+        """Compile rules to one regular expression.
+
+        The last matching rule wins, so rules are tried in reverse order. Consecutive rules with the same
+        polarity are joined into one group. Returns (regexp, list of flags 'group ignores')
+        """
+        groups = []
+        ignoring = []
+        for rule in reversed(rules):
+            if rule.anchored or self.nameOnly:
+                regExp = rule.regExp
+            else:
+                regExp = '(?:.*/)?' + rule.regExp
+            if ignoring and ignoring[-1] == (not rule.negated):
+                groups[-1].append(regExp)
+            else:
+                groups.append([regExp])
+                ignoring.append(not rule.negated)
+
+        if not groups:
+            return (None, [])
+
+        pattern = '|'.join(['(%s)' % '|'.join(group) for group in groups])
+        return (re.compile(pattern), ignoring)
+
+    def _literals(self, rules):
+        """Get (names, prefixes, suffixes) for the fast check of rules like name, prefix* and *suffix.
+        None, if there are other rules
+        """
+        if not self.nameOnly:
+            return None
+
+        names = set()
+        prefixes = []
+        suffixes = []
+        for rule in rules:
+            pattern = rule.pattern
+            if rule.negated:
+                return None
+            elif _isLiteral(pattern):
+                names.add(pattern)
+            elif pattern.endswith('*') and _isLiteral(pattern[:-1]):
+                prefixes.append(pattern[:-1])
+            elif pattern.startswith('*') and _isLiteral(pattern[1:]):
+                suffixes.append(pattern[1:])
+            else:
+                return None
+        return (names, tuple(prefixes), tuple(suffixes))
+
+    def match(self, relDir, name, isDir):
+        """Check entry. relDir is path of the directory of the entry, relative to the directory of the rules,
+        with trailing /, or ''.
+
+        Returns True, if the entry is ignored, False, if it is re-included, None, if no rule matches
+        """
+        literals = self._dirLiterals if isDir else self._fileLiterals
+        if literals is not None:
+            names, prefixes, suffixes = literals
+            if name in names or name.startswith(prefixes) or name.endswith(suffixes):
+                return True
+            return None
+
+        if isDir:
+            regExp, ignoring = self._dirRegExp, self._dirIgnoring
+        else:
+            regExp, ignoring = self._fileRegExp, self._fileIgnoring
+
+        if regExp is None:
+            return None
+        match = regExp.match(name if self.nameOnly else relDir + name)
+        if match is None:
+            return None
+        return ignoring[match.lastindex - 1]
+
+
+class Matcher:
+    """Checks entries of a directory against all rule sets, which apply to it.
+
+    Rule sets of deeper directories win. A directory without ignore file uses the matcher of the parent,
+    if all its rule sets are name-only, otherwise a matcher, which shares the compiled rule sets
+    """
+    def __init__(self, ruleSets, relDirs):
+        self._ruleSets = ruleSets  # the deepest is the last
+        self._relDirs = relDirs  # path of the directory, relative to the directory of every rule set
+        self.nameOnly = all([ruleSet.nameOnly for ruleSet in ruleSets])
+
+    def child(self, name, ruleSet=None):
+        """Get Matcher for the subdirectory. ruleSet is _RuleSet of its ignore file or None
+        """
+        if ruleSet is None and self.nameOnly:
+            return self
+
+        ruleSets = self._ruleSets
+        relDirs = [relDir + name + '/' for relDir in self._relDirs]
+        if ruleSet is not None:
+            ruleSets = ruleSets + [ruleSet]
+            relDirs.append('')
+        return Matcher(ruleSets, relDirs)
+
+    def isIgnored(self, name, isDir):
+        """Check if entry of the directory is hidden or ignored
+        """
+        for index in range(len(self._ruleSets) - 1, -1, -1):
+            ignored = self._ruleSets[index].match(self._relDirs[index], name, isDir)
+            if ignored is not None:
+                return ignored
+        return False
+
+
+_matchers = {}  # directory path: (validated time, ignore file mtime, parent Matcher, Matcher)
+_matchersLock = threading.Lock()
+_MAX_CACHED_MATCHERS = 10000
+
+
+def matcherForDirectory(dirPath):
+    """Get Matcher for entries of the directory
+    """
+    dirPath = os.path.abspath(dirPath)
+    now = time.time()
+
+    with _matchersLock:
+        cached = _matchers.get(dirPath)
+    if cached is not None and now - cached[0] < validationPeriod:
+        return cached[3]
+
+    parentPath = os.path.dirname(dirPath)
+    if parentPath != dirPath:
+        parent = matcherForDirectory(parentPath)
+    else:  # file system root
+        parent = None
+
+    ignoreFilePath = os.path.join(dirPath, ignoreFileName)
+    try:
+        mtime = os.stat(ignoreFilePath).st_mtime
+    except OSError:
+        mtime = None
+
+    if cached is not None and cached[1] == mtime and cached[2] is parent:
+        matcher = cached[3]
+    else:
+        ruleSet = None
+        if mtime is not None:
+            try:
+                with open(ignoreFilePath) as ignoreFile:
+                    rules = parseRules(ignoreFile.readlines())
+            except IOError:
+                rules = []
+            if rules:
+                ruleSet = _RuleSet(rules)
+
+        if parent is not None:
+            matcher = parent.child(os.path.basename(dirPath), ruleSet)
+        else:
+            ruleSets = [_RuleSet(parseRules(defaultRules))]
+            if ruleSet is not None:
+                ruleSets.append(ruleSet)
+            matcher = Matcher(ruleSets, [''] * len(ruleSets))
+
+    with _matchersLock:
+        if len(_matchers) >= _MAX_CACHED_MATCHERS:
+            _matchers.clear()
+        _matchers[dirPath] = (now, mtime, parent, matcher)
+    return matcher
+
+
+def isIgnored(path, isDir):
+    """Check if file or directory is hidden or ignored
+    """
+    path = os.path.abspath(path)
+    dirPath, name = os.path.split(path)
+    return matcherForDirectory(dirPath).isIgnored(name, isDir)
+
+
+def setDefaultRules(rules):
+    """Replace default rules. Rules have .gitignore syntax
+    """
+    global defaultRules
+    defaultRules = list(rules)
+    with _matchersLock:
+        _matchers.clear()
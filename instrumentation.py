@@ -0,0 +1,200 @@
+"""
+instrumentation --- Timing of Locator stages
+============================================
+
+Optional timing of the keystroke processing stages. Disabled by default.
+
+Stages:
+
+    parse       parsing text with the commands
+    completer   command.completer(), including construction of the completer
+    inline      AbstractCompleter.inline()
+    model       _CompleterModel.setCompleter()
+    resize      resizing of the first column
+    paint       HTMLDelegate.paint() of one item
+
+Durations are collected in rolling histograms per command class and stage. Only the latest
+samples are kept. Usage:
+
+    instrumentation.enable(logInterval=60)
+    ...
+    print instrumentation.summary()
+
+Code of the stages calls start() and record(). When instrumentation is disabled, start() returns None
+and record() returns immediately
+"""
+
+import bisect
+import collections
+import logging
+import threading
+import time
+
+
+"""Upper bounds of histogram buckets, milliseconds. The last bucket is unlimited
+"""
+BUCKET_BOUNDS = [0.1 * (2 ** (index / 2.)) for index in range(34)]  # 0.1 ms ... ~10 s
+
+"""Command name for the stages, which do not belong to a command
+"""
+NO_COMMAND = '-'
+
+_logger = logging.getLogger('locator.instrumentation')
+
+_CURRENT = object()  # record() default. Use the current command
+
+enabled = False
+_logInterval = None
+_lastLogTime = 0
+_windowSize = 1000
+_currentCommand = NO_COMMAND
+_histograms = {}  # (command name, stage): RollingHistogram
+_lock = threading.Lock()
+
+
+class RollingHistogram:
+    """Histogram of the latest windowSize durations
+    """
+    def __init__(self, windowSize):
+        self._samples = collections.deque()
+        self._windowSize = windowSize
+        self._counts = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, duration):
+        """Add duration in milliseconds. The oldest sample is dropped, if the window is full
+        """
+        if len(self._samples) == self._windowSize:
+            self._counts[self._bucket(self._samples.popleft())] -= 1
+        self._samples.append(duration)
+        self._counts[self._bucket(duration)] += 1
+
+    @staticmethod
+    def _bucket(duration):
+        return bisect.bisect_left(BUCKET_BOUNDS, duration)
+
+    def count(self):
+        """Count of samples in the window
+        """
+        return len(self._samples)
+
+    def buckets(self):
+        """List of (upper bound in milliseconds, count). Bound of the last bucket is None
+        """
+        return zip(BUCKET_BOUNDS + [None], self._counts)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket, which contains the percentile. Returns maximum sample for
+        the last bucket and None, if there are no samples
+        """
+        if not self._samples:
+            return None
+        rank = max(1, int(fraction * len(self._samples) + 0.5))
+        total = 0
+        for index, count in enumerate(self._counts):
+            total += count
+            if total >= rank:
+                if index < len(BUCKET_BOUNDS):
+                    return BUCKET_BOUNDS[index]
+                break
+        return max(self._samples)
+
+
+def enable(logInterval=None, windowSize=1000):
+    """Start collecting durations.
+
+    If logInterval is set, summary is logged to 'locator.instrumentation' logger
+    not more often than once per logInterval seconds
+    """
+    global enabled, _logInterval, _windowSize, _lastLogTime
+    _logInterval = logInterval
+    _windowSize = windowSize
+    _lastLogTime = time.time()
+    enabled = True
+
+
+def disable():
+    """Stop collecting durations. Collected histograms are kept
+    """
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Drop collected histograms
+    """
+    with _lock:
+        _histograms.clear()
+
+
+def setCurrentCommand(command):
+    """Set command, which owns the shown completer. Durations recorded without command
+    (i.e. painting) are accounted to it. None means no command
+    """
+    global _currentCommand
+    if enabled:
+        _currentCommand = _commandName(command)
+
+
+def _commandName(command):
+    if command is None:
+        return NO_COMMAND
+    return command.__class__.__name__
+
+
+def start():
+    """Get start time of a stage. Returns None, if instrumentation is disabled
+    """
+    if not enabled:
+        return None
+    return time.time()
+
+
+def record(stage, startTime, command=_CURRENT):
+    """Record duration of the stage. startTime is the value returned by start().
+
+    If command is not given, the current command is used, see setCurrentCommand()
+    """
+    if startTime is None:
+        return
+    duration = (time.time() - startTime) * 1000.
+    name = _currentCommand if command is _CURRENT else _commandName(command)
+
+    with _lock:
+        histogram = _histograms.get((name, stage))
+        if histogram is None:
+            histogram = RollingHistogram(_windowSize)
+            _histograms[(name, stage)] = histogram
+        histogram.add(duration)
+
+    _maybeLog()
+
+
+def histograms():
+    """Get dict {(command class name, stage): RollingHistogram}
+    """
+    with _lock:
+        return dict(_histograms)
+
+
+def summary():
+    """Get text table with count, p50, p99 of every command and stage
+    """
+    lines = ['%-24s %-10s %8s %10s %10s' % ('command', 'stage', 'count', 'p50, ms', 'p99, ms')]
+    with _lock:
+        for (name, stage), histogram in sorted(_histograms.items()):
+            lines.append('%-24s %-10s %8d %10.2f %10.2f' % \
+                            (name, stage, histogram.count(),
+                             histogram.percentile(0.5), histogram.percentile(0.99)))
+    return '\n'.join(lines)
+
+
+def _maybeLog():
+    """Log summary, if logInterval has passed since the last time
+    """
+    global _lastLogTime
+    if _logInterval is None:
+        return
+    now = time.time()
+    if now - _lastLogTime >= _logInterval:
+        _lastLogTime = now
+        _logger.info('Locator stage timings:\n%s', summary())
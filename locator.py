@@ -4,161 +4,23 @@ locator --- Locator dialog and functionality
 
 Implements widget, which appears, when you press Ctrl+L and it's functionality
 
-Contains definition of AbstractCommand and AbstractCompleter interfaces
+AbstractCommand and AbstractCompleter interfaces are defined in locatorcore and are available here too
 """
 
 
 
-from PyQt4.QtCore import pyqtSignal, QAbstractItemModel, QModelIndex, QSize, Qt
-from PyQt4.QtGui import QApplication, QFontMetrics, QPalette, QSizePolicy, QStyle, \
+from PyQt4.QtCore import pyqtSignal, QAbstractItemModel, QModelIndex, QSize, Qt, QTimer
+from PyQt4.QtGui import QApplication, QFontMetrics, QLabel, QPalette, QSizePolicy, QStyle, \
                         QStyle, QStyleOptionFrameV2, \
                         QTextCursor, QTextEdit, QTextOption, QTreeView, QVBoxLayout, QWidget
 
 import os
 
-from pyparsing import Optional, Or, ParseException, StringEnd, White
-
-
+import instrumentation
+import slowprofiler
+import history
 from htmldelegate import HTMLDelegate
-
-class AbstractCommand:
-    """Base class for Locator commands.
-    
-    Inherit it to create own commands. Than add your command with Locator.addCommandClass()
-    """
-    
-    @staticmethod
-    def signature():
-        """Command signature. Shown in the Help. Example:
-        
-        '[f] PATH [LINE]'
-        """
-        raise NotImplemented()
-    
-    @staticmethod
-    def description():
-        """Command description. Shown in the Help. Example:
-        
-        'Open file. Globs are supported'
-        """
-        raise NotImplemented()
-
-    @staticmethod
-    def pattern():
-        """pyparsing pattern, which recognizes and constructs commands.
-        
-        See TODO LINK workspace_commands as example
-        """
-        raise NotImplemented()
-    
-    def completer(self, text, pos):
-        """TODO LINK Completer instance for partially typed command.
-        
-        Return None, if your command doesn't have completer, or if completion is not available now
-        """
-        return None
-
-    @staticmethod
-    def isAvailable():
-        """Check if command is available now.
-        
-        i.e. SaveAs command is not available, if not files are opened
-        """
-        return True
-    
-    def constructCommand(self, completableText):
-        """After user clicked item on the TreeView, Locator
-        
-        1) gets item full text with AbstractCompleter.getFullText() method
-        2) constructs a command with this text using currentCommand.constructCommand()
-        3) sets command to the LineEdit
-        4) tries to execute the command
-        """
-        return None
-
-    def isReadyToExecute(self):
-        """Check if command is ready to execute.
-        
-        It is ready, when it is complete (contains all mandatory arguments) and arguments are valid
-        """
-        return True
-
-    def execute(self):
-        """Execute the command
-        """
-        raise NotImplemented()
-
-
-class AbstractCompleter:
-    """Completer for Locator.
-    
-    Provides:
-    * inline completion
-    * command(s) description
-    * status and any other information from command
-    * list of possible completions
-    """
-    
-    def rowCount(self):
-        """Row count for TreeView
-        """
-        raise NotImplemented()
-    
-    def columnCount(self):
-        """Column count for tree view. Default is 1
-        """
-        return 1
-    
-    def text(self, row, column):
-        """Text for TreeView item
-        """
-        raise NotImplemented()
-    
-    def icon(self, row, column):
-        """Icon for TreeView item. Default is None
-        """
-        return None
-    
-    def inline(self):
-        """Inline completion.
-        
-        Shown after cursor. Appedned to the typed text, if Tab is pressed
-        """
-        return None
-    
-    def getFullText(self, row):
-        """Row had been clicked by mouse. Get inline completion, which will be inserted after cursor
-        """
-        return None
-
-
-class _HelpCompleter(AbstractCompleter):
-    """AbstractCompleter implementation, which shows help about all or one command
-    """
-    def __init__(self, commands):
-        self._commands = commands
-    
-    def rowCount(self):
-        """AbstractCompleter method implementation
-        
-        Return count of available commands
-        """
-        return len(self._commands)
-    
-    def columnCount(self):
-        """AbstractCompleter method implementation
-        """
-        return 2
-    
-    def text(self, row, column):
-        """AbstractCompleter method implementation
-        
-        Return command description
-        """
-        if column == 0:
-            return self._commands[row].signature()
-        else:
-            return self._commands[row].description()
+from locatorcore import AbstractCommand, AbstractCompleter, LocatorCore
 
 
 class _CompleterModel(QAbstractItemModel):
@@ -168,10 +30,20 @@ class _CompleterModel(QAbstractItemModel):
     and simple AbstractCompleter interface.
     Provides data for TreeView with completions and information
     """
+    
+    """Completer applied data, calculated in the background
+    """
+    completerUpdated = pyqtSignal()
+    
+    """Completer notified, that background data is ready. Emitted from a worker thread
+    """
+    _updateReady = pyqtSignal(object)
 
     def __init__(self):
         QAbstractItemModel.__init__(self)
         self.completer = None
+        self._transitionRowCount = None  # row count, while rows are removed and inserted. See _changeRows()
+        self._updateReady.connect(self._onUpdateReady)
 
     def index(self, row, column, parent):
         """QAbstractItemModel method implementation
@@ -188,6 +60,8 @@ class _CompleterModel(QAbstractItemModel):
         """
         if index.isValid():
             return 0
+        if self._transitionRowCount is not None:
+            return self._transitionRowCount
         if self.completer is None:
             return 0
         
@@ -211,11 +85,137 @@ class _CompleterModel(QAbstractItemModel):
             return self.completer.icon(index.row(), index.column())
         return None
     
-    def setCompleter(self, completer):
-        """Set completer, which will be used as data source
+    def canFetchMore(self, parent):
+        """QAbstractItemModel method implementation
+        """
+        if parent.isValid() or self.completer is None:
+            return False
+        return self.completer.canFetchMore()
+    
+    def fetchMore(self, parent):
+        """QAbstractItemModel method implementation
+        """
+        if parent.isValid() or self.completer is None:
+            return
+        
+        for row, count, insert in self.completer.fetchMore():
+            self.beginInsertRows(QModelIndex(), row, row + count - 1)
+            insert()
+            self.endInsertRows()
+        
+        self._emitAllDataChanged()  # status might be changed
+    
+    def _emitAllDataChanged(self):
+        """Emit dataChanged for all rows. View repaints only visible ones
         """
+        rowCount = self.rowCount(QModelIndex())
+        columnCount = self.columnCount(QModelIndex())
+        if rowCount and columnCount:
+            self.dataChanged.emit(self.index(0, 0, QModelIndex()),
+                                  self.index(rowCount - 1, columnCount - 1, QModelIndex()))
+    
+    def setCompleter(self, completer):
+        """Set completer, which will be used as data source.
+        
+        If rows of the old and new completers are comparable, only removed and inserted rows are reported
+        to the view, so selection and scroll position are kept
+        """
+        oldCompleter = self.completer
+        oldIds = None
+        if oldCompleter is not None:
+            oldCompleter.setUpdateHandler(None)
+            if completer is not None and \
+               oldCompleter.columnCount() == completer.columnCount():
+                oldIds = oldCompleter.rowIds()
+        
         self.completer = completer
-        self.modelReset.emit()
+        if completer is None or \
+           not self._reportRowChanges(oldIds, completer.rowIds()):
+            self.modelReset.emit()
+        
+        if completer is not None:
+            completer.setUpdateHandler(self._updateReady.emit)
+    
+    def _onUpdateReady(self, completer):
+        """Completer has calculated data in the background. Apply it, if the completer is still in use
+        """
+        if completer is not self.completer:
+            return
+        
+        oldIds = completer.rowIds()
+        if completer.applyUpdate():
+            if not self._reportRowChanges(oldIds, completer.rowIds()):
+                self.modelReset.emit()
+            self.completerUpdated.emit()
+    
+    @staticmethod
+    def _diffRows(oldIds, newIds):
+        """Compare row identities.
+        
+        Returns (removed, inserted) lists of (first, last) ranges. removed contains indexes in oldIds,
+        inserted - indexes in newIds. Returns None, if common rows are reordered, or nothing is common
+        """
+        oldSet = set(oldIds)
+        newSet = set(newIds)
+        removed = []
+        inserted = []
+        common = 0
+        oldIndex = 0
+        newIndex = 0
+        
+        def addToRanges(ranges, index):
+            if ranges and ranges[-1][1] == index - 1:
+                ranges[-1] = (ranges[-1][0], index)
+            else:
+                ranges.append((index, index))
+        
+        while oldIndex < len(oldIds) or newIndex < len(newIds):
+            if oldIndex < len(oldIds) and newIndex < len(newIds) and \
+               oldIds[oldIndex] == newIds[newIndex]:
+                common += 1
+                oldIndex += 1
+                newIndex += 1
+            elif oldIndex < len(oldIds) and oldIds[oldIndex] not in newSet:
+                addToRanges(removed, oldIndex)
+                oldIndex += 1
+            elif newIndex < len(newIds) and newIds[newIndex] not in oldSet:
+                addToRanges(inserted, newIndex)
+                newIndex += 1
+            else:
+                return None  # reordered
+        
+        if not common:
+            return None
+        return (removed, inserted)
+    
+    def _reportRowChanges(self, oldIds, newIds):
+        """Data has been replaced. Report removed and inserted rows to the view.
+        
+        The view does not request data, until changes are reported. Row count is emulated
+        for every step. Returns False, if rows are not comparable, and the model shall be reset
+        """
+        if oldIds is None or newIds is None:
+            return False
+        
+        diff = self._diffRows(oldIds, newIds)
+        if diff is None:
+            return False
+        
+        removed, inserted = diff
+        self._transitionRowCount = len(oldIds)
+        for first, last in reversed(removed):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self._transitionRowCount -= last - first + 1
+            self.endRemoveRows()
+        
+        for first, last in inserted:
+            self.beginInsertRows(QModelIndex(), first, last)
+            self._transitionRowCount += last - first + 1
+            self.endInsertRows()
+        
+        self._transitionRowCount = None
+        self._emitAllDataChanged()  # texts of common rows might be changed
+        return True
 
 
 class _CompletableLineEdit(QTextEdit):
@@ -240,6 +240,12 @@ class _CompletableLineEdit(QTextEdit):
     """Down pressed, roll history
     """
     historyNext = pyqtSignal()
+    """Ctrl+R pressed, start history search
+    """
+    historySearch = pyqtSignal()
+    """Key pressed in the history search mode. QKeyEvent is the argument
+    """
+    historySearchKey = pyqtSignal(object)
     
     def __init__(self, *args):
         QTextEdit.__init__(self, *args)
@@ -250,6 +256,7 @@ class _CompletableLineEdit(QTextEdit):
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
         self.setFixedHeight(self.sizeHint().height())
         self._inlineCompletion = None
+        self.historySearchMode = False  # keys are not edited, but emitted with historySearchKey
         
     def sizeHint(self):
         """QWidget.sizeHint implementation. Returns height of 1 line of text
@@ -279,15 +286,22 @@ class _CompletableLineEdit(QTextEdit):
             return QTextEdit.event(self, event)
     
     def keyPressEvent(self, event):
-        """QWidget.keyPressEvent implementation. Catches Return, Up, Down, Ctrl+Backspace
+        """QWidget.keyPressEvent implementation. Catches Return, Up, Down, Ctrl+Backspace, Ctrl+R
         """
         self._clearInlineCompletion()
+        if self.historySearchMode:
+            self.historySearchKey.emit(event)
+            return
+        
         if event.key() in (Qt.Key_Enter, Qt.Key_Return):
             self.enterPressed.emit()
         elif event.key() == Qt.Key_Up:
             self.historyPrevious.emit()
         elif event.key() == Qt.Key_Down:
             self.historyNext.emit()
+        elif event.key() == Qt.Key_R and \
+             event.modifiers() == Qt.ControlModifier:
+            self.historySearch.emit()
         elif event.key() == Qt.Key_Backspace and \
              event.modifiers() == Qt.ControlModifier:
             # Ctrl+Backspace. Usualy deletes word, but, for this edit should delete path level
@@ -361,13 +375,29 @@ class _CompletableLineEdit(QTextEdit):
 class Locator(QWidget):
     """Locator widget and implementation
     """
+    
+    """Count of the first rows, which are measured to resize the first column in the fast layout mode.
+    Visible rows are measured too
+    """
+    columnWidthSampleRows = 100
+    
+    """Latency budget for the completion list, milliseconds. Updates of the list during this time are coalesced,
+    only the latest completer is shown. Inline completion is shown immediately
+    """
+    listUpdateDelay = 30
+    
     def __init__(self, *args):
         QWidget.__init__(self, *args)
         
-        self._commandClasses = []
-        self._history = ['']
-        self._historyIndex = 0
+        self._core = LocatorCore()
+        self._history = history.History(history.defaultFilePath())
+        self._navigator = history.Navigator(self._history)
         self._incompleteCommand = None
+        self._pendingCompleter = None  # completer, which will be shown after listUpdateDelay
+        
+        self._listUpdateTimer = QTimer(self)
+        self._listUpdateTimer.setSingleShot(True)
+        self._listUpdateTimer.timeout.connect(self._showPendingCompleter)
         
         self.setLayout(QVBoxLayout())
         self.layout().setContentsMargins(0, 0, 0, 0)
@@ -375,12 +405,19 @@ class Locator(QWidget):
         
         self._table = QTreeView(self)
         self._model = _CompleterModel()
+        self._model.completerUpdated.connect(self._onCompleterUpdated)
         self._table.setModel(self._model)
-        self._table.setItemDelegate(HTMLDelegate())
+        self._delegate = HTMLDelegate()
+        self._table.setItemDelegate(self._delegate)
         self._table.setRootIsDecorated(False)
         self._table.setHeaderHidden(True)
         self._table.clicked.connect(self._onItemClicked)
         self.layout().addWidget(self._table)
+        self.setFastLayout(True)
+        
+        self._historySearchLabel = QLabel(self)
+        self._historySearchLabel.hide()
+        self.layout().addWidget(self._historySearchLabel)
         
         self._edit = _CompletableLineEdit(self)
         self.layout().addWidget(self._edit)
@@ -388,6 +425,8 @@ class Locator(QWidget):
         self._edit.enterPressed.connect(self._onEnterPressed)
         self._edit.historyPrevious.connect(self._onHistoryPrevious)
         self._edit.historyNext.connect(self._onHistoryNext)
+        self._edit.historySearch.connect(self._onHistorySearch)
+        self._edit.historySearchKey.connect(self._onHistorySearchKey)
         self.setFocusProxy(self._edit)
 
         self._edit.setFocus()
@@ -410,86 +449,186 @@ class Locator(QWidget):
 
     def _updateCompletion(self):
         """User edited text or moved cursor. Update inline and TreeView completion
+        
+        Slow updates are profiled, if slowprofiler is enabled
         """
         text = self._edit.toPlainText()
-        completer = None
+        slowprofiler.call(text, self._updateCompletionForText, text)
+    
+    def _updateCompletionForText(self, text):
+        """Update inline completion for the text. TreeView is updated after listUpdateDelay.
         
-        command = self._parseCommand(text)
-        if command is not None:
-            completer = command.completer(self._edit.toPlainText(), self._edit.textCursor().position())
-
-            if completer is not None:
-                inline = completer.inline()
-                if inline:
-                    self._edit.setInlineCompletion(inline)
-            else:
-                completer = _HelpCompleter([command])
-        else:
-            completer = _HelpCompleter(self._availableCommands())
-
+        The first completer is shown immediately, so the list is not empty on start
+        """
+        command, completer = self._core.complete(text, self._edit.textCursor().position())
+        instrumentation.setCurrentCommand(command)
+        
+        startTime = instrumentation.start()
+        inline = completer.inline()
+        instrumentation.record('inline', startTime)
+        if inline:
+            self._edit.setInlineCompletion(inline)
+        
+        self._pendingCompleter = completer
+        if self._model.completer is None:  # nothing is shown yet
+            self._showPendingCompleter()
+        elif not self._listUpdateTimer.isActive():
+            self._listUpdateTimer.start(self.listUpdateDelay)
+    
+    def _showPendingCompleter(self):
+        """Latency budget has expired. Show the latest completer in the list
+        """
+        self._listUpdateTimer.stop()
+        completer = self._pendingCompleter
+        self._pendingCompleter = None
+        if completer is None:
+            return
+        
+        startTime = instrumentation.start()
         self._model.setCompleter(completer)
+        instrumentation.record('model', startTime)
+        
         if completer.columnCount() > 1:
+            startTime = instrumentation.start()
+            self._resizeFirstColumn()
+            instrumentation.record('resize', startTime)
+    
+    def setFastLayout(self, enabled):
+        """Enable or disable fast layout mode. Enabled by default.
+        
+        In the fast mode all rows have the same height, row sizes are estimated with font metrics,
+        and only a sample of rows is measured to resize the first column
+        """
+        self._fastLayout = enabled
+        self._table.setUniformRowHeights(enabled)
+        self._delegate.fastSizeHint = enabled
+    
+    def _resizeFirstColumn(self):
+        """Resize the first column to its contents. Measures only sample and visible rows in the fast layout mode
+        """
+        rowCount = self._model.rowCount(QModelIndex())
+        if not self._fastLayout or rowCount <= self.columnWidthSampleRows:
             self._table.resizeColumnToContents(0)
-            self._table.setColumnWidth(0, self._table.columnWidth(0) + 20)  # 20 px spacing between columns
+            width = self._table.columnWidth(0)
+        else:
+            rows = set(range(self.columnWidthSampleRows))
+            viewportRect = self._table.viewport().rect()
+            firstVisible = self._table.indexAt(viewportRect.topLeft()).row()
+            lastVisible = self._table.indexAt(viewportRect.bottomLeft()).row()
+            if firstVisible != -1:
+                if lastVisible == -1:
+                    lastVisible = rowCount - 1
+                rows.update(range(firstVisible, lastVisible + 1))
+            width = max([self._table.sizeHintForIndex(self._model.index(row, 0, QModelIndex())).width() \
+                            for row in rows])
+        
+        self._table.setColumnWidth(0, width + 20)  # 20 px spacing between columns
+    
+    def _onCompleterUpdated(self):
+        """Completer calculated its data in the background. Show inline completion
+        """
+        if self._pendingCompleter is not None:  # text has been changed, completer is outdated
+            return
+        inline = self._model.completer.inline()
+        if inline:
+            self._edit.setInlineCompletion(inline)
     
     def _onEnterPressed(self):
         """User pressed Enter or clicked item. Execute command, if possible
         """
-        text = self._edit.toPlainText().strip()
-        command = self._parseCommand(text)
+        text = self._edit.toPlainText()
+        command = self._parseCommand(text)  # the same text as completion parsed. Cached command is reused
+        text = text.strip()
         if command is not None and command.isReadyToExecute():
             command.execute()
-            self._history[-1] = text
-            if len(self._history) > 1 and \
-               self._history[-1].strip() == self._history[-2].strip():
-                   self._history = self._history[:-1]  # if the last command repeats, remove duplicate
-            self._history.append('')  # new edited command
-            self._historyIndex = len(self._history) - 1
+            self._history.append(text)  # repeated command is not added
+            self._navigator.reset()
             self._edit.clear()
             self._updateCompletion()
     
     def _onHistoryPrevious(self):
         """User pressed Up. Roll history
         """
-        if self._historyIndex == len(self._history) - 1:  # save edited command
-            self._history[self._historyIndex] = self._edit.toPlainText()
-        
-        if self._historyIndex > 0:
-            self._historyIndex -= 1
-            self._edit.setPlainText(self._history[self._historyIndex])
+        text = self._navigator.previous(self._edit.toPlainText())
+        if text is not None:
+            self._edit.setPlainText(text)
     
     def _onHistoryNext(self):
         """User pressed Down. Roll history
         """
-        if self._historyIndex < len(self._history) - 1:
-            self._historyIndex += 1
-            self._edit.setPlainText(self._history[self._historyIndex])
+        text = self._navigator.next()
+        if text is not None:
+            self._edit.setPlainText(text)
+    
+    def _onHistorySearch(self):
+        """User pressed Ctrl+R. Start history search mode.
+        
+        Typed chars are added to the search query, the latest command, which contains the query, is shown.
+        Ctrl+R shows older matching command, Backspace undoes the last query change, Escape restores
+        the edited command. Other keys stop searching and are processed as usual
+        """
+        self._navigator.startSearch(self._edit.toPlainText())
+        self._edit.historySearchMode = True
+        self._showHistorySearch(True)
+    
+    def _onHistorySearchKey(self, event):
+        """Key pressed in the history search mode
+        """
+        key = event.key()
+        text = event.text()
+        if key == Qt.Key_R and event.modifiers() == Qt.ControlModifier:
+            self._showHistorySearchResult(self._navigator.searchOlder())
+        elif key == Qt.Key_Backspace:
+            if self._navigator.undoSearch():
+                self._showHistorySearchResult(True)
+        elif key == Qt.Key_Escape:
+            self._edit.setPlainText(self._navigator.cancelSearch())
+            self._stopHistorySearch()
+            self._updateCompletion()
+        elif text and text >= ' ' and not event.modifiers() & (Qt.ControlModifier | Qt.AltModifier):
+            self._showHistorySearchResult(self._navigator.refineSearch(text))
+        else:
+            self._navigator.stopSearch()
+            self._stopHistorySearch()
+            self._edit.keyPressEvent(event)
+    
+    def _showHistorySearchResult(self, found):
+        """Show the found command and the query. Beep, if not found
+        """
+        if found:
+            self._edit.setPlainText(self._navigator.current())
+            self._updateCompletion()
+        else:
+            QApplication.beep()
+        self._showHistorySearch(found)
+    
+    def _showHistorySearch(self, found):
+        """Show the search query above the edit
+        """
+        prompt = 'History search' if found else 'History search, not found'
+        self._historySearchLabel.setText('%s: %s' % (prompt, self._navigator.searchQuery))
+        self._historySearchLabel.show()
+    
+    def _stopHistorySearch(self):
+        """Leave the history search mode in the GUI. The shown command stays in the edit
+        """
+        self._edit.historySearchMode = False
+        self._historySearchLabel.hide()
     
     def addCommandClass(self, commandClass):
         """Add new command to the locator. Shall be called by plugins, which provide locator commands
         """
-        self._commandClasses.append(commandClass)
+        self._core.addCommandClass(commandClass)
     
     def removeCommandClass(self, commandClass):
         """Remove command from the locator. Shall be called by plugins when terminating it
         """        
-        self._commandClasses.remove(commandClass)
-    
-    def _availableCommands(self):
-        """Get list of available commands
-        """
-        return [cmd for cmd in self._commandClasses if cmd.isAvailable()]
+        self._core.removeCommandClass(commandClass)
 
     def _parseCommand(self, text):
         """Parse text and try to get command
         """
-        optWs = Optional(White()).suppress()
-        pattern = optWs + Or([cmd.pattern() for cmd in self._availableCommands()]) + optWs + StringEnd()
-        try:
-            res = pattern.parseString(text)
-            return res[0]
-        except ParseException:
-            return None
+        return self._core.parseCommand(text)
 
     def show(self):
         """QWidget.show implementation. Updates completion before showing widget
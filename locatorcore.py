@@ -0,0 +1,364 @@
+"""
+locatorcore --- Locator engine without GUI
+==========================================
+
+Parses typed text with the commands and creates completers. Does not depend on Qt,
+might be used in batch mode and in tools. See headless.py
+
+Contains definition of AbstractCommand and AbstractCompleter interfaces
+"""
+
+from pyparsing import Optional, Or, ParseException, StringEnd, White
+
+import instrumentation
+
+
+class AbstractCommand:
+    """Base class for Locator commands.
+    
+    Inherit it to create own commands. Than add your command with Locator.addCommandClass()
+    """
+    
+    @staticmethod
+    def signature():
+        """Command signature. Shown in the Help. Example:
+        
+        '[f] PATH [LINE]'
+        """
+        raise NotImplemented()
+    
+    @staticmethod
+    def description():
+        """Command description. Shown in the Help. Example:
+        
+        'Open file. Globs are supported'
+        """
+        raise NotImplemented()
+
+    @staticmethod
+    def pattern():
+        """pyparsing pattern, which recognizes and constructs commands.
+        
+        See TODO LINK workspace_commands as example
+        """
+        raise NotImplemented()
+    
+    @staticmethod
+    def prefixes():
+        """Leading literals of the command. Example:
+        
+        ['f ', '']
+        
+        Locator tries to parse text with the pattern only if the text starts with one of the prefixes.
+        Empty string means that the command may start with anything.
+        Default is [''], the command is tried for any text
+        """
+        return ['']
+    
+    def completer(self, text, pos):
+        """TODO LINK Completer instance for partially typed command.
+        
+        Return None, if your command doesn't have completer, or if completion is not available now
+        """
+        return None
+
+    @staticmethod
+    def isAvailable():
+        """Check if command is available now.
+        
+        i.e. SaveAs command is not available, if not files are opened
+        """
+        return True
+    
+    def constructCommand(self, completableText):
+        """After user clicked item on the TreeView, Locator
+        
+        1) gets item full text with AbstractCompleter.getFullText() method
+        2) constructs a command with this text using currentCommand.constructCommand()
+        3) sets command to the LineEdit
+        4) tries to execute the command
+        """
+        return None
+
+    def prepareToExecute(self):
+        """Command has been parsed from the text, which user is editing.
+        
+        Command may start slow validation in the background, so isReadyToExecute() does not block,
+        when user presses Enter. Default implementation does nothing
+        """
+        pass
+
+    def isReadyToExecute(self):
+        """Check if command is ready to execute.
+        
+        It is ready, when it is complete (contains all mandatory arguments) and arguments are valid
+        """
+        return True
+
+    def execute(self):
+        """Execute the command
+        """
+        raise NotImplemented()
+
+
+class AbstractCompleter:
+    """Completer for Locator.
+    
+    Provides:
+    * inline completion
+    * command(s) description
+    * status and any other information from command
+    * list of possible completions
+    """
+    
+    def rowCount(self):
+        """Row count for TreeView
+        """
+        raise NotImplemented()
+    
+    def columnCount(self):
+        """Column count for tree view. Default is 1
+        """
+        return 1
+    
+    def text(self, row, column):
+        """Text for TreeView item
+        """
+        raise NotImplemented()
+    
+    def icon(self, row, column):
+        """Icon for TreeView item. Default is None
+        """
+        return None
+    
+    def inline(self):
+        """Inline completion.
+        
+        Shown after cursor. Appedned to the typed text, if Tab is pressed
+        """
+        return None
+    
+    def getFullText(self, row):
+        """Row had been clicked by mouse. Get inline completion, which will be inserted after cursor
+        """
+        return None
+    
+    def rowIds(self):
+        """List of hashable identities of the rows. Row of a new completer, which has the same identity
+        as a row of the previous completer, shows the same item.
+        
+        Locator compares identities to update only changed rows, when the completer is replaced.
+        Return None, if rows can not be compared. Default is None
+        """
+        return None
+    
+    def canFetchMore(self):
+        """Check if completer can load more rows.
+        
+        Long lists might be loaded by portions, while user scrolls them. Default is False
+        """
+        return False
+    
+    def fetchMore(self):
+        """Load next portion of rows.
+        
+        Returns list of (row, count, insert) tuples. insert() inserts count rows at row position.
+        Locator calls insert() functions in order, and notifies the view before and after each call.
+        
+        Slow completers return an empty list, load rows in the background, and deliver them
+        with the update handler. See setUpdateHandler()
+        """
+        return []
+    
+    def setUpdateHandler(self, handler):
+        """Set function, which completer calls, when data, calculated in the background, is ready.
+        
+        Handler might be called from any thread with completer as parameter.
+        Locator reacts on it by calling applyUpdate() from the GUI thread.
+        Default implementation does nothing, completer calculates everything in the constructor
+        """
+        pass
+    
+    def applyUpdate(self):
+        """Apply data, calculated in the background. Called from the GUI thread.
+        
+        Return True, if rows have been changed
+        """
+        return False
+    
+    def wait(self, timeout=None):
+        """Wait for data, calculated in the background, and apply it. For synchronous use without Locator.
+        
+        Returns False on timeout. Default implementation returns True, completer calculates everything
+        in the constructor
+        """
+        return True
+
+
+class _HelpCompleter(AbstractCompleter):
+    """AbstractCompleter implementation, which shows help about all or one command
+    """
+    def __init__(self, commands):
+        self._commands = commands
+    
+    def rowCount(self):
+        """AbstractCompleter method implementation
+        
+        Return count of available commands
+        """
+        return len(self._commands)
+    
+    def columnCount(self):
+        """AbstractCompleter method implementation
+        """
+        return 2
+    
+    def text(self, row, column):
+        """AbstractCompleter method implementation
+        
+        Return command description
+        """
+        if column == 0:
+            return self._commands[row].signature()
+        else:
+            return self._commands[row].description()
+    
+    def rowIds(self):
+        """AbstractCompleter method implementation
+        """
+        return list(self._commands)
+
+
+class _CommandRouter:
+    """Parses text with commands, which may recognize it.
+    
+    Keeps a trie of the commands by their leading literals (see AbstractCommand.prefixes()).
+    Only the commands, which prefix matches the text, and the commands without prefix, are tried.
+    Compiled grammars are cached per set of the tried commands
+    """
+    def __init__(self, commands):
+        self._commands = commands
+        self._trie = {}  # char: subtree. None: commands, which prefix ends here
+        self._grammars = {}
+        
+        for command in commands:
+            for prefix in command.prefixes():
+                node = self._trie
+                for char in prefix:
+                    node = node.setdefault(char, {})
+                node.setdefault(None, []).append(command)
+        
+        # pattern() builds new pyparsing elements on every call. Build it once and share between grammars
+        self._patterns = dict([(command, command.pattern()) for command in commands])
+    
+    def _candidates(self, text):
+        """Get commands, which may recognize text, in the order they have been added
+        """
+        node = self._trie
+        candidates = set(node.get(None, []))
+        for char in text.lstrip():
+            node = node.get(char)
+            if node is None:
+                break
+            candidates.update(node.get(None, []))
+        
+        return tuple([command for command in self._commands if command in candidates])
+    
+    def _grammar(self, commands):
+        """Get compiled grammar for the set of commands
+        """
+        grammar = self._grammars.get(commands)
+        if grammar is None:
+            optWs = Optional(White()).suppress()
+            grammar = optWs + Or([self._patterns[command] for command in commands]) + optWs + StringEnd()
+            grammar.streamline()
+            self._grammars[commands] = grammar
+        return grammar
+    
+    def parse(self, text):
+        """Parse text and try to get command. Returns None, if no commands recognize the text
+        """
+        commands = self._candidates(text)
+        if not commands:
+            return None
+        
+        try:
+            res = self._grammar(commands).parseString(text)
+            return res[0]
+        except ParseException:
+            return None
+
+
+class LocatorCore:
+    """Commands and completion without GUI.
+    
+    Locator widget uses it to parse text and get completers
+    """
+    def __init__(self):
+        self._commandClasses = []
+        self._router = None  # parser of available commands. See _commandRouter()
+        self._routerCommands = None  # available commands, for which self._router has been built
+        self._parsedText = None  # the last parsed text, its router and command. See parseCommand()
+        self._parsedRouter = None
+        self._parsedCommand = None
+    
+    def addCommandClass(self, commandClass):
+        """Add new command
+        """
+        self._commandClasses.append(commandClass)
+        self._router = None
+    
+    def removeCommandClass(self, commandClass):
+        """Remove command
+        """
+        self._commandClasses.remove(commandClass)
+        self._router = None
+    
+    def availableCommands(self):
+        """Get list of available commands
+        """
+        return [cmd for cmd in self._commandClasses if cmd.isAvailable()]
+    
+    def _commandRouter(self):
+        """Get parser of available commands.
+        
+        Parser is built once and reused, until command set or commands availability changes
+        """
+        commands = self.availableCommands()
+        if self._router is None or commands != self._routerCommands:
+            self._router = _CommandRouter(commands)
+            self._routerCommands = commands
+        return self._router
+    
+    def parseCommand(self, text):
+        """Parse text and try to get command. Returns None, if no commands recognize the text.
+        
+        The last result is cached, so completion, Enter and item click get the same command instance
+        for the same text
+        """
+        router = self._commandRouter()
+        if text != self._parsedText or router is not self._parsedRouter:
+            startTime = instrumentation.start()
+            self._parsedCommand = router.parse(text)
+            instrumentation.record('parse', startTime, self._parsedCommand)
+            self._parsedText = text
+            self._parsedRouter = router
+        return self._parsedCommand
+    
+    def complete(self, text, pos):
+        """Get (command, completer) for the text and the cursor position.
+        
+        command is None, if text is not recognized. If there is no completion for the command,
+        completer shows help about the command. Completer is never None
+        """
+        command = self.parseCommand(text)
+        if command is not None:
+            command.prepareToExecute()
+            startTime = instrumentation.start()
+            completer = command.completer(text, pos)
+            instrumentation.record('completer', startTime, command)
+            if completer is None:
+                completer = _HelpCompleter([command])
+        else:
+            completer = _HelpCompleter(self.availableCommands())
+        return (command, completer)
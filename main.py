@@ -8,7 +8,7 @@ sip.setapi('QString', 2)
 from PyQt4.QtGui import QApplication
 
 from locator import Locator
-from workspace_commands import CommandGotoLine, CommandOpen, CommandSaveAs
+from workspace_commands import CommandGotoFile, CommandGotoLine, CommandOpen, CommandSaveAs
 
 def main():
     app = QApplication(sys.argv)
@@ -16,6 +16,7 @@ def main():
     locator.addCommandClass(CommandGotoLine)
     locator.addCommandClass(CommandOpen)
     locator.addCommandClass(CommandSaveAs)
+    locator.addCommandClass(CommandGotoFile)
     locator.show()
     return app.exec_()
 
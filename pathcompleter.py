@@ -3,27 +3,43 @@ pathcompleter --- Path completer for Locator
 ============================================
 """
 
+try:
+    from PyQt4.QtGui import QApplication, QPalette, QStyle
+except ImportError:  # headless mode, see locatorcore
+    QApplication = None
 
-from PyQt4.QtCore import Qt
-from PyQt4.QtGui import qApp, QFileSystemModel, QPalette, QStyle
-
+import errno
 import os
 import os.path
 import glob
+import re
+import threading
 
-from htmldelegate import htmlEscape
-from locator import AbstractCompleter
+from collections import OrderedDict
 
-import fnmatch
-import re
-regExPatterns = [fnmatch.translate(f) for f in ['*.pyc']]
-compositeRegExpPattern = '(' + ')|('.join(regExPatterns) + ')'
-filterRegExp = re.compile(compositeRegExpPattern)
+import dirlisting
+import frecency
+import ignore
+import treewalker
+from htmlutils import htmlEscape
+from iconprovider import iconForPath
+from locatorcore import AbstractCompleter
+from worker import WorkerPool
+
+def _application():
+    """Get QApplication instance, or None, if completers are used without GUI
+    """
+    if QApplication is None:
+        return None
+    return QApplication.instance()
 
 def makeSuitableCompleter(text, pos):
-    """Returns PathCompleter if text is normal path or GlobCompleter for glob
+    """Returns PathCompleter if text is normal path, GlobCompleter for glob
+    or RecursiveGlobCompleter for glob with ** segments
     """
-    if '*' in text or '?' in text or '[' in text:
+    if treewalker.isRecursiveGlob(text):
+        return RecursiveGlobCompleter(text)
+    elif '*' in text or '?' in text or '[' in text:
         return GlobCompleter(text)
     else:
         return PathCompleter(text, pos)
@@ -32,8 +48,22 @@ class AbstractPathCompleter(AbstractCompleter):
     """Base class for PathCompleter and GlobCompleter
     """
     
-    # global object. Reused by all completers
-    _fsModel = QFileSystemModel()
+    # Directories are scanned in the background. Only the newest scan is actual, older are cancelled
+    _scanPool = WorkerPool()
+    
+    """Time to wait for scanning results in the constructor before showing 'Scanning...' status. Seconds
+    """
+    syncScanTimeout = 0.02
+    
+    """Show the most frequently and recently opened files first. Other files are sorted by name.
+    Files, opened with Open command, are recorded to the store, see frecency module.
+    Set to False to sort all the files by name
+    """
+    frecencyRanking = True
+    
+    """Count of files, which are moved up by frecencyRanking
+    """
+    frecencyTopK = 10
 
     _ERROR = 'error'
     _HEADER = 'currentDir'
@@ -47,17 +77,81 @@ class AbstractPathCompleter(AbstractCompleter):
         self._files = []
         self._error = None
         self._status = None
+        self._lock = threading.Lock()
+        self._updateHandler = None
+        self._scanTask = None
+        self._scanResult = None
     
-    @staticmethod
-    def _filterHidden(paths):
-        """Remove hidden and ignored files from the list
+    def _startScan(self, scanFunc):
+        """Execute scanFunc(task) in the background.
+        
+        scanFunc returns tuple (dirs, files, status, error), or None, if task has been cancelled.
+        Results are applied immediately, if ready in syncScanTimeout, otherwise 'Scanning...' is shown
         """
-        return [path for path in paths \
-                    if not os.path.basename(path).startswith('.') and \
-                        not filterRegExp.match(path)]
-
+        self._scanTask = self._scanPool.submit(scanFunc, self._onScanFinished)
+        if not (self._scanTask.wait(self.syncScanTimeout) and self.applyUpdate()):
+            self._status = 'Scanning...'
+    
+    def wait(self, timeout=None):
+        """AbstractCompleter method implementation.
+        
+        Wait for background scanning and apply its results
+        """
+        if self._scanTask is not None and not self._scanTask.wait(timeout):
+            return False
+        self.applyUpdate()
+        return True
+    
+    def _rankFiles(self, files):
+        """Apply frecencyRanking, if enabled. Returns new list
+        """
+        if not self.frecencyRanking:
+            return files
+        return frecency.store().rank(files, self.frecencyTopK)
+    
+    def _onScanFinished(self, task):
+        """Scanning finished. Called in a worker thread
+        """
+        result = task.result
+        if result is None:  # scanFunc failed
+            result = ([], [], None, 'Failed to scan the directory')
+        
+        with self._lock:
+            self._scanResult = result
+            handler = self._updateHandler
+        
+        if handler is not None:
+            handler(self)
+    
+    def setUpdateHandler(self, handler):
+        """AbstractCompleter method implementation.
+        
+        Handler is called when background scanning finishes
+        """
+        with self._lock:
+            self._updateHandler = handler
+            ready = self._scanResult is not None
+        
+        if handler is not None and ready:
+            handler(self)
+    
+    def applyUpdate(self):
+        """AbstractCompleter method implementation.
+        
+        Apply background scanning results
+        """
+        with self._lock:
+            result = self._scanResult
+            self._scanResult = None
+        
+        if result is None:
+            return False
+        
+        self._dirs, self._files, self._status, self._error = result
+        return True
+    
     def _classifyRowIndex(self, row):
-        """Get list item type and index by it's row
+        """Get list item type and index by it's row. Constant time, called for every painted row
         """
 
         if self._error:
@@ -73,11 +167,11 @@ class AbstractPathCompleter(AbstractCompleter):
                 return (self._STATUS, 0)
             row -= 1
         
-        if row in range(len(self._dirs)):
+        if 0 <= row < len(self._dirs):
             return (self._DIRECTORY, row)
         row -= len(self._dirs)
         
-        if row in range(len(self._files)):
+        if 0 <= row < len(self._files):
             return (self._FILE, row)
         
         assert False
@@ -85,9 +179,12 @@ class AbstractPathCompleter(AbstractCompleter):
     def _formatHeader(self, text):
         """Format current directory for show it in the list of completions
         """
+        app = _application()
+        if app is None:
+            return htmlEscape(text)
         return '<font style="background-color: %s; color: %s">%s</font>' % \
-                (qApp.palette().color(QPalette.Window).name(),
-                 qApp.palette().color(QPalette.WindowText).name(),
+                (app.palette().color(QPalette.Window).name(),
+                 app.palette().color(QPalette.WindowText).name(),
                  htmlEscape(text))
 
     def rowCount(self):
@@ -103,12 +200,20 @@ class AbstractPathCompleter(AbstractCompleter):
             count += len(self._files)
             return count
 
-    @staticmethod
-    def _iconForPath(path):
-        """Get icon for file or directory path. Uses QFileSystemModel
+    def rowIds(self):
+        """AbstractCompleter method implementation.
+        
+        Paths identify directories and files. Header, status and error are identified by their types
         """
-        index = AbstractPathCompleter._fsModel.index(path)
-        return AbstractPathCompleter._fsModel.data(index, Qt.DecorationRole)
+        if self._error:
+            return [(self._ERROR,)]
+        
+        ids = [(self._HEADER,)]
+        if self._status:
+            ids.append((self._STATUS,))
+        ids.extend(self._dirs)
+        ids.extend(self._files)
+        return ids
 
     def text(self, row, column):
         """Item text in the list of completions
@@ -130,37 +235,121 @@ class AbstractPathCompleter(AbstractCompleter):
         """
         rowType, index = self._classifyRowIndex(row)
         if rowType == self._ERROR:
-            return qApp.style().standardIcon(QStyle.SP_MessageBoxCritical)
+            app = _application()
+            if app is None:
+                return None
+            return app.style().standardIcon(QStyle.SP_MessageBoxCritical)
         elif rowType == self._HEADER:
             return None
         elif rowType == self._STATUS:
             return None
         elif rowType == self._DIRECTORY:
-            return self._iconForPath(self._dirs[index])
+            return iconForPath(self._dirs[index], True)
         elif rowType == self._FILE:
-            return self._iconForPath(self._files[index])
+            return iconForPath(self._files[index], False)
 
     def getFullText(self, row):
         """User clicked a row. Get inline completion for this row
         """
-        row -= 1  # skip current directory
-        path = None
-        if row in range(len(self._dirs)):
-            return self._dirs[row] + '/'
-        else:
-            row -= len(self._dirs)  # skip dirs
-            if row in range(len(self._files)):
-                return self._files[row]
+        rowType, index = self._classifyRowIndex(row)
+        if rowType == self._DIRECTORY:
+            return self._dirs[index] + '/'
+        elif rowType == self._FILE:
+            return self._files[index]
         
         return None
 
 
+class _MatchCache:
+    """Recent matching results for one directory.
+    
+    While user types a file name, the typed prefix grows or shrinks by a char.
+    Matches for a longer prefix are filtered out of the matches for a shorter one,
+    matches for an already typed prefix are reused.
+    Results are dropped, when other directory is listed, or the listing is updated
+    """
+    _MAX_PREFIXES = 64
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listing = None
+        self._results = OrderedDict()  # prefix: (dirs, files). The last is most recently used
+    
+    def matches(self, listing, prefix, isCancelled):
+        """Get (dirs, files) tuple of absolute paths of not hidden entries, which start with prefix.
+        
+        Returned lists are shared and must not be modified.
+        Returns None, if cancelled
+        """
+        with self._lock:
+            if listing is not self._listing:
+                self._listing = listing
+                self._results.clear()
+            
+            result = self._results.pop(prefix, None)
+            if result is None:
+                shorter = [cached for cached in self._results if prefix.startswith(cached)]
+                if shorter:
+                    base = self._results[max(shorter, key=len)]
+            else:
+                self._results[prefix] = result
+                return result
+        
+        if shorter:
+            result = self._narrow(base, listing.path, prefix)
+        else:
+            result = self._filter(listing, prefix, isCancelled)
+            if result is None:
+                return None
+        
+        with self._lock:
+            if listing is self._listing:
+                self._results[prefix] = result
+                if len(self._results) > self._MAX_PREFIXES:
+                    self._results.popitem(last=False)
+        return result
+    
+    @staticmethod
+    def _narrow(base, dirPath, prefix):
+        """Filter matches for a shorter prefix
+        """
+        baseDirs, baseFiles = base
+        pathPrefix = os.path.join(dirPath, prefix)
+        return ([path for path in baseDirs if path.startswith(pathPrefix)],
+                [path for path in baseFiles if path.startswith(pathPrefix)])
+    
+    @staticmethod
+    def _filter(listing, prefix, isCancelled):
+        """Filter matches out of the directory listing
+        """
+        dirs = []
+        files = []
+        # names are sorted, matching ones are a continuous range
+        start, end = listing.prefixRange(prefix)
+        matcher = ignore.matcherForDirectory(listing.path)
+        for index in xrange(start, end):
+            if isCancelled():
+                return None
+            variant = listing.names[index]
+            if matcher.isIgnored(variant, listing.dirFlags[index]):
+                continue
+            absPath = os.path.join(listing.path, variant)
+            if listing.dirFlags[index]:
+                dirs.append(absPath)
+            else:
+                files.append(absPath)
+        return (dirs, files)
+
+
 class PathCompleter(AbstractPathCompleter):
     """Path completer for Locator. Supports globs
     
     Used by Open command
     """
     
+    # global object. Reused by all completers
+    _matchCache = _MatchCache()
+    
     def __init__(self, text, pos):
         AbstractPathCompleter.__init__(self, text)
         
@@ -177,37 +366,53 @@ class PathCompleter(AbstractPathCompleter):
         self._path = os.path.normpath(enterredDir)
         if self._path != '/':
             self._path += '/'
-
-        if not os.path.isdir(self._path):
-            self._status = 'No directory %s' % self._path
-            return
-
+        self._enterredFile = enterredFile
+        
+        self._inline = None
+        self._inlineCalculated = False
+        self._formattedPaths = {}  # path: HTML. Filled, when rows are painted
+        
+        self._startScan(self._scan)
+    
+    def applyUpdate(self):
+        """AbstractCompleter method implementation.
+        
+        Drop inline completion and rows HTML, calculated for the old data
+        """
+        if not AbstractPathCompleter.applyUpdate(self):
+            return False
+        self._inlineCalculated = False
+        self._formattedPaths = {}
+        return True
+    
+    def _scan(self, task):
+        """Scan the directory. Called in a worker thread
+        """
+        dirs = []
+        files = []
+        
         try:
-            filesAndDirs = os.listdir(self._path)
+            listing = dirlisting.listDirectory(self._path, task.isCancelled)
         except OSError, ex:
-            self._error = unicode(str(ex), 'utf8')
-            return
+            if ex.errno in (errno.ENOENT, errno.ENOTDIR):
+                return (dirs, files, 'No directory %s' % self._path, None)
+            return (dirs, files, None, unicode(str(ex), 'utf8'))
         
-        if not filesAndDirs:
-            self._status = 'Empty directory'
-            return
-            
-        # filter matching
-        variants = [path for path in filesAndDirs\
-                        if path.startswith(enterredFile)]
+        if listing is None:  # cancelled
+            return None
         
-        variants = self._filterHidden(variants)
-        variants.sort()
+        if not listing.names:
+            return (dirs, files, 'Empty directory', None)
         
-        for variant in variants:
-            absPath = os.path.join(self._path, variant)
-            if os.path.isdir(absPath):
-                self._dirs.append(absPath)
-            else:
-                self._files.append(absPath)
+        matches = self._matchCache.matches(listing, self._enterredFile, task.isCancelled)
+        if matches is None:  # cancelled
+            return None
+        dirs, files = matches
 
-        if not self._dirs and not self._files:
-            self._status = 'No matching files'
+        if not dirs and not files:
+            return (dirs, files, 'No matching files', None)
+        
+        return (dirs, self._rankFiles(files), None, None)
 
     def _headerText(self):
         """Get text, which shall be displayed on the header
@@ -215,19 +420,26 @@ class PathCompleter(AbstractPathCompleter):
         return self._path
     
     def _formatPath(self, path, isDir):
-        """Format file or directory for show it in the list of completions
+        """Format file or directory for show it in the list of completions.
+        
+        Formatted only when the row is shown first time, and cached
         """
-        path = os.path.basename(path)
+        formatted = self._formattedPaths.get(path)
+        if formatted is not None:
+            return formatted
+        
+        name = os.path.basename(path)
         if isDir:
-            path += '/'
+            name += '/'
 
         typedLen = self._lastTypedSegmentLength()
-        inline = self.inline()
-        typedLenPlusInline = typedLen + len(self.inline())
-        return '<b>%s</b><u>%s</u>%s' % \
-            (htmlEscape(path[:typedLen]),
-             htmlEscape(path[typedLen:typedLenPlusInline]),
-             htmlEscape(path[typedLenPlusInline:]))
+        typedLenPlusInline = typedLen + len(self.inline() or '')
+        formatted = '<b>%s</b><u>%s</u>%s' % \
+            (htmlEscape(name[:typedLen]),
+             htmlEscape(name[typedLen:typedLenPlusInline]),
+             htmlEscape(name[typedLenPlusInline:]))
+        self._formattedPaths[path] = formatted
+        return formatted
 
     def _lastTypedSegmentLength(self):
         """Length of path segment, typed by a user
@@ -236,16 +448,18 @@ class PathCompleter(AbstractPathCompleter):
         """
         return len(os.path.split(self._originalText)[1])
     
-    def _commonStart(self, a, b):
-        """The longest common start of 2 string
-        """
-        for index, char in enumerate(a):
-            if len(b) <= index or b[index] != char:
-                return a[:index]
-        return a
-
     def inline(self):
-        """Inline completion. Displayed after the cursor
+        """Inline completion. Displayed after the cursor.
+        
+        Calculated once, when requested first time
+        """
+        if not self._inlineCalculated:
+            self._inline = self._calculateInline()
+            self._inlineCalculated = True
+        return self._inline
+    
+    def _calculateInline(self):
+        """Calculate inline completion. The longest common start of the matching names
         """
         if self._error is not None:
             return None
@@ -253,7 +467,7 @@ class PathCompleter(AbstractPathCompleter):
             if self._dirs or self._files:
                 dirs = [os.path.basename(dir) + '/' for dir in self._dirs]
                 files = [os.path.basename(file) for file in self._files]
-                commonPart = reduce(self._commonStart, dirs + files)
+                commonPart = os.path.commonprefix(dirs + files)
                 return commonPart[self._lastTypedSegmentLength():]
             else:
                 return ''
@@ -262,22 +476,183 @@ class PathCompleter(AbstractPathCompleter):
 class GlobCompleter(AbstractPathCompleter):
     """Path completer for Locator. Supports globs, does not support inline completion
     
+    Glob is expanded by portions. The first portion is shown immediately, next ones are loaded
+    in the background, when user scrolls the list, until maxResults paths are shown.
+    The glob generator is used only by worker threads, by one task at a time
+    
     Used by Open command
     """
+    
+    """Count of paths in one portion
+    """
+    batchSize = 100
+    
+    """Maximum count of shown paths
+    """
+    maxResults = 1000
+    
+    # Next portions are loaded here, so loading does not make the glob expansion stale
+    _fetchPool = WorkerPool(1)
+    
     def __init__(self, text):
         AbstractPathCompleter.__init__(self, text)
-        variants = glob.iglob(os.path.expanduser(text) + '*')
-        variants = self._filterHidden(variants)
-        variants.sort()
+        self._variants = None  # generator of (path, isDir) for not hidden matching paths. Used by workers
+        self._seeds = frozenset()  # normalized frecent files, shown first. Skipped, when streamed
+        self._variantsExhausted = False  # set by workers
+        self._exhausted = False  # applied copy of _variantsExhausted
+        self._loaded = False  # the first portion has been applied
+        self._fetchTask = None  # loading of the next portion
+        self._startScan(self._scan)
+    
+    def _scan(self, task):
+        """Expand the first portion of the glob. Called in a worker thread
+        """
+        pattern = os.path.expanduser(self._originalText) + '*'
+        self._variants = self._expand(pattern, task.isCancelled)
+        seeds = self._frecentFiles(pattern)
+        self._seeds = frozenset(seeds)
         
-        for path in sorted(variants):
-            if os.path.isdir(path):
-                self._dirs.append(path)
-            else:
-                self._files.append(path)
+        batch = self._readBatch(len(seeds), task.isCancelled)
+        if batch is None:
+            return None
+        dirs, files = batch
+        files = seeds + files
+        
+        if not dirs and not files:
+            return (dirs, files, 'No matching files', None)
+        elif self._variantsExhausted:
+            return (dirs, files, None, None)
+        else:
+            return (dirs, files, self._streamStatus(len(dirs) + len(files)), None)
+    
+    def _fetch(self, task):
+        """Read the next portion. Called in a worker thread.
+        
+        Returns all loaded paths. Completer is cancelled, when the expansion becomes stale
+        """
+        dirs, files = self._dirs, self._files  # not modified by the GUI thread, while the task is running
+        batch = self._readBatch(len(dirs) + len(files), self._scanTask.isCancelled)
+        if batch is None:
+            return None
+        newDirs, newFiles = batch
+        dirs = dirs + newDirs
+        files = files + newFiles
+        return (dirs, files, self._streamStatus(len(dirs) + len(files)), None)
+    
+    def _expand(self, pattern, isCancelled):
+        """Get generator of (path, isDir) for not ignored paths, matching the pattern
+        """
+        for path in glob.iglob(pattern):
+            isDir = dirlisting.isDir(path)
+            if not ignore.isIgnored(path, isDir):
+                yield (path, isDir)
+    
+    def _globRegExp(self, pattern):
+        """Get regular expression, which matches the same paths as _expand()
+        """
+        return treewalker.globRegExp(pattern, recursive=False)
+    
+    def _frecentFiles(self, pattern):
+        """Get up to frecencyTopK the most frequently and recently opened files, matching the pattern,
+        the best first. Empty list, if frecencyRanking is disabled.
+        
+        Files are ranked among all opened files, not among a portion. Called in a worker thread
+        """
+        if not self.frecencyRanking:
+            return []
+        
+        isAbsolute = os.path.isabs(pattern)
+        regExp = re.compile(self._globRegExp(os.path.abspath(pattern)))
+        files = []
+        for path in frecency.store().ranked(lambda path: regExp.match(path) is not None):
+            if not isAbsolute:
+                path = os.path.relpath(path)
+            if os.path.isfile(path) and not ignore.isIgnored(path, False):
+                files.append(path)
+                if len(files) == self.frecencyTopK:
+                    break
+        return files
+    
+    def _readBatch(self, loadedCount, isCancelled):
+        """Read next portion of paths. Returns sorted (dirs, files) or None, if cancelled.
+        
+        Called in a worker thread. Frecent files, shown in the first portion, are skipped
+        """
+        dirs = []
+        files = []
+        count = min(self.batchSize, self.maxResults - loadedCount)
+        for index in xrange(count):
+            if isCancelled():
+                return None
+            try:
+                path, isDir = self._variants.next()
+            except StopIteration:
+                self._variantsExhausted = True
+                break
+            if isDir:
+                dirs.append(path)
+            elif not self._seeds or os.path.normpath(path) not in self._seeds:
+                files.append(path)
+        
+        if loadedCount + len(dirs) + len(files) >= self.maxResults:
+            self._variants.close()  # stop walking, nothing will be shown
         
-        if not self._dirs and not self._files:
-            self._status = 'No matching files'
+        dirs.sort()
+        files.sort()
+        return (dirs, files)
+    
+    def _streamStatus(self, count):
+        """Status for not the first portion of paths. Status row is shown, until all paths are loaded
+        """
+        if self._variantsExhausted:
+            return '%d matching paths' % count
+        elif count >= self.maxResults:
+            return '%d+ matches. Type more to narrow the list' % count
+        else:
+            return '%d matches loaded. Scroll to load more' % count
+    
+    def applyUpdate(self):
+        """AbstractCompleter method implementation.
+        
+        Apply the first or the next portion of paths
+        """
+        if not AbstractPathCompleter.applyUpdate(self):
+            return False
+        self._exhausted = self._variantsExhausted
+        self._loaded = True
+        self._fetchTask = None
+        return True
+    
+    def wait(self, timeout=None):
+        """AbstractCompleter method implementation.
+        
+        Wait for the first portion, or for the portion, requested by fetchMore()
+        """
+        if not AbstractPathCompleter.wait(self, timeout):
+            return False
+        if self._fetchTask is not None:
+            if not self._fetchTask.wait(timeout):
+                return False
+            self.applyUpdate()
+        return True
+    
+    def canFetchMore(self):
+        """AbstractCompleter method implementation.
+        
+        Check if there are not loaded paths, and no portion is being loaded
+        """
+        return self._loaded and \
+               self._fetchTask is None and \
+               not self._exhausted and \
+               len(self._dirs) + len(self._files) < self.maxResults
+    
+    def fetchMore(self):
+        """AbstractCompleter method implementation.
+        
+        Start loading the next portion in the background. Loaded paths are delivered with the update handler
+        """
+        self._fetchTask = self._fetchPool.submit(self._fetch, self._onScanFinished)
+        return []
 
     def _formatPath(self, path, isDir):
         """GlobCompleter shows paths as is
@@ -288,3 +663,22 @@ class GlobCompleter(AbstractPathCompleter):
         """Get text, which shall be displayed on the header
         """
         return self._originalText
+
+
+class RecursiveGlobCompleter(GlobCompleter):
+    """Path completer for globs with ** segments. ** matches any count of directories
+    
+    The tree is walked in parallel threads, hidden and ignored directories are not walked.
+    Walking stops, when user types next char
+    
+    Used by Open command
+    """
+    def _expand(self, pattern, isCancelled):
+        """Get generator of (path, isDir) for not hidden paths, matching the pattern
+        """
+        return treewalker.iglobRecursive(pattern, isCancelled)
+    
+    def _globRegExp(self, pattern):
+        """Get regular expression, which matches the same paths as _expand()
+        """
+        return treewalker.globRegExp(pattern)
@@ -0,0 +1,136 @@
+"""
+slowprofiler --- Traces of slow completion updates
+==================================================
+
+Profiles every completion update with cProfile and saves the profile only if the update
+took longer than the threshold. Saved traces are kept in a directory, the oldest ones are removed,
+when there are more than maxTraces traces.
+
+Every trace consists of two files:
+
+    slow-<unix time>-<duration>ms.prof  pstats data. Open it with python -m pstats
+    slow-<unix time>-<duration>ms.txt   query, duration, size of the completed directory and the hottest functions
+
+Enable it with environment variable LOCATOR_SLOW_PROFILE=<threshold, milliseconds>
+(LOCATOR_SLOW_PROFILE_DIR sets the directory), or with enable().
+Only the GUI thread is profiled, background scanning is not included in the traces
+"""
+
+import cProfile
+import os
+import os.path
+import pstats
+import StringIO
+import time
+
+import dirlisting
+
+
+enabled = False
+_threshold = None
+_directory = None
+_maxTraces = None
+
+
+def defaultDirectory():
+    """Default directory for traces
+    """
+    cacheDir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cacheDir, 'completer', 'slow-traces')
+
+
+def enable(threshold=100, directory=None, maxTraces=50):
+    """Start profiling. Traces of updates, which took longer than threshold milliseconds,
+    are saved to directory
+    """
+    global enabled, _threshold, _directory, _maxTraces
+    _threshold = threshold
+    _directory = directory or defaultDirectory()
+    _maxTraces = maxTraces
+    enabled = True
+
+
+def disable():
+    """Stop profiling
+    """
+    global enabled
+    enabled = False
+
+
+def call(query, func, *args):
+    """Call func(*args). If profiling is enabled, profile it and save the trace, if it is slow.
+
+    query is the text, which is being completed. It is saved with the trace
+    """
+    if not enabled:
+        return func(*args)
+
+    profile = cProfile.Profile()
+    startTime = time.time()
+    try:
+        return profile.runcall(func, *args)
+    finally:
+        duration = (time.time() - startTime) * 1000.
+        if duration >= _threshold:
+            try:
+                _saveTrace(profile, query, duration)
+            except (IOError, OSError):
+                pass  # never break completion because of profiling
+
+
+def directorySize(query):
+    """Count of entries in the directory of the path, typed in the query.
+
+    Only cached listing is used, the directory is not scanned. None, if it is not cached
+    """
+    path = query.split(' ', 1)[-1].strip()
+    dirPath = os.path.abspath(os.path.dirname(os.path.expanduser(path)) or os.curdir)
+    listing = dirlisting.cachedListing(dirPath)
+    if listing is None:
+        return None
+    return len(listing)
+
+
+def _saveTrace(profile, query, duration):
+    """Save profile and description. Remove the oldest traces
+    """
+    if not os.path.isdir(_directory):
+        os.makedirs(_directory)
+
+    baseName = 'slow-%017.6f-%dms' % (time.time(), duration)
+    basePath = os.path.join(_directory, baseName)
+    profile.dump_stats(basePath + '.prof')
+
+    stream = StringIO.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats('cumulative').print_stats(40)
+
+    with open(basePath + '.txt', 'w') as description:
+        description.write('query: %r\n' % query)
+        description.write('duration: %.1f ms\n' % duration)
+        description.write('directory size: %s\n' % directorySize(query))
+        description.write('\n')
+        description.write(stream.getvalue())
+
+    _removeOldTraces()
+
+
+def _removeOldTraces():
+    """Keep not more than maxTraces traces. Names start with time, so sorted names are sorted by age
+    """
+    names = sorted([name for name in os.listdir(_directory) \
+                        if name.startswith('slow-') and name.endswith('.prof')])
+    for name in names[:max(0, len(names) - _maxTraces)]:
+        basePath = os.path.join(_directory, name[:-len('.prof')])
+        for extension in ('.prof', '.txt'):
+            try:
+                os.remove(basePath + extension)
+            except OSError:
+                pass
+
+
+if os.environ.get('LOCATOR_SLOW_PROFILE'):
+    try:
+        enable(float(os.environ['LOCATOR_SLOW_PROFILE']), os.environ.get('LOCATOR_SLOW_PROFILE_DIR'))
+    except ValueError:  # profiling is not enabled with invalid threshold
+        pass
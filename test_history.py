@@ -0,0 +1,88 @@
+"""
+test_history --- Tests of persistent history and its navigation
+===============================================================
+
+Run with python -m unittest test_history
+"""
+
+import codecs
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import history
+
+
+class NavigatorTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.filePath = os.path.join(self.root, 'history')
+        with codecs.open(self.filePath, 'w', 'utf-8') as historyFile:
+            historyFile.write(u'f src/main.py\nl 10\nf src/mainwindow.py\ns doc.txt\n')
+        self.navigator = history.Navigator(history.History(self.filePath))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_up_down(self):
+        self.assertEqual(self.navigator.previous(u'f ed'), u's doc.txt')
+        self.assertEqual(self.navigator.previous(u's doc.txt'), u'f src/mainwindow.py')
+        self.assertEqual(self.navigator.next(), u's doc.txt')
+        self.assertEqual(self.navigator.next(), u'f ed')
+        self.assertEqual(self.navigator.next(), None)
+
+    def test_up_to_the_oldest(self):
+        for i in range(4):
+            text = self.navigator.previous(u'')
+        self.assertEqual(text, u'f src/main.py')
+        self.assertEqual(self.navigator.previous(text), None)
+
+    def test_search(self):
+        self.navigator.startSearch(u'f ed')
+        self.assertTrue(self.navigator.refineSearch(u'm'))
+        self.assertEqual(self.navigator.current(), u'f src/mainwindow.py')
+        self.assertTrue(self.navigator.refineSearch(u'a'))  # the shown command still matches
+        self.assertEqual(self.navigator.current(), u'f src/mainwindow.py')
+        self.assertTrue(self.navigator.searchOlder())
+        self.assertEqual(self.navigator.current(), u'f src/main.py')
+        self.assertFalse(self.navigator.searchOlder())
+        self.assertEqual(self.navigator.current(), u'f src/main.py')
+
+        self.assertTrue(self.navigator.undoSearch())
+        self.assertEqual(self.navigator.current(), u'f src/mainwindow.py')
+        self.assertEqual(self.navigator.cancelSearch(), u'f ed')
+        self.assertEqual(self.navigator.searchQuery, None)
+
+    def test_failed_search_keeps_query(self):
+        self.navigator.startSearch(u'')
+        self.assertTrue(self.navigator.refineSearch(u'doc'))
+        self.assertFalse(self.navigator.refineSearch(u'x'))
+        self.assertEqual(self.navigator.searchQuery, u'docx')
+        self.assertEqual(self.navigator.current(), u's doc.txt')
+        self.assertTrue(self.navigator.undoSearch())
+        self.assertEqual(self.navigator.searchQuery, u'doc')
+
+    def test_reset_after_execute(self):
+        self.navigator.previous(u'')
+        self.navigator.history.append(u'l 20')
+        self.navigator.reset()
+        self.assertEqual(self.navigator.previous(u''), u'l 20')
+
+
+class HistoryTest(unittest.TestCase):
+    def test_broken_file(self):
+        root = tempfile.mkdtemp()
+        try:
+            filePath = os.path.join(root, 'history')
+            with open(filePath, 'wb') as historyFile:
+                historyFile.write('f \xff.py\nl 10\n')
+            entries = history.History(filePath)
+            self.assertEqual(len(entries), 2)
+            self.assertEqual(entries[1], u'l 10')
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+test_ignore --- Tests of .gitignore rules matching
+==================================================
+
+Run with python -m unittest test_ignore
+"""
+
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import ignore
+
+
+class IgnoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def writeRules(self, relDir, lines):
+        dirPath = os.path.join(self.root, relDir)
+        if not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+        with open(os.path.join(dirPath, ignore.ignoreFileName), 'w') as ignoreFile:
+            ignoreFile.write(''.join([line + '\n' for line in lines]))
+
+    def isIgnored(self, relPath, isDir=False):
+        return ignore.isIgnored(os.path.join(self.root, relPath), isDir)
+
+    def test_default(self):
+        self.assertTrue(self.isIgnored('.hidden'))
+        self.assertTrue(self.isIgnored('src/module.pyc'))
+        self.assertFalse(self.isIgnored('src/module.py'))
+
+    def test_anchoring(self):
+        self.writeRules('', ['/build', 'doc/*.txt', 'tmp'])
+        self.assertTrue(self.isIgnored('build', True))
+        self.assertFalse(self.isIgnored('src/build', True))
+        self.assertTrue(self.isIgnored('doc/readme.txt'))
+        self.assertFalse(self.isIgnored('src/doc/readme.txt'))
+        self.assertTrue(self.isIgnored('tmp'))
+        self.assertTrue(self.isIgnored('src/deep/tmp', True))
+
+    def test_nested(self):
+        self.writeRules('', ['*.log'])
+        self.writeRules('src', ['/out', '!keep.log'])
+        self.assertTrue(self.isIgnored('debug.log'))
+        self.assertTrue(self.isIgnored('src/debug.log'))
+        self.assertFalse(self.isIgnored('src/keep.log'))
+        self.assertFalse(self.isIgnored('src/lib/keep.log'))
+        self.assertTrue(self.isIgnored('keep.log'))
+        self.assertTrue(self.isIgnored('src/out', True))
+        self.assertFalse(self.isIgnored('out', True))
+        self.assertFalse(self.isIgnored('src/lib/out', True))
+
+    def test_negation(self):
+        self.writeRules('', ['*.txt', '!important.txt', 'important.txt.bak'])
+        self.assertTrue(self.isIgnored('notes.txt'))
+        self.assertFalse(self.isIgnored('important.txt'))
+        self.assertTrue(self.isIgnored('important.txt.bak'))
+        self.writeRules('negated', ['*.txt', '!*.txt'])
+        self.assertFalse(self.isIgnored('negated/notes.txt'))
+
+    def test_dirOnly(self):
+        self.writeRules('', ['out/', 'lib/cache/'])
+        self.assertTrue(self.isIgnored('out', True))
+        self.assertTrue(self.isIgnored('src/out', True))
+        self.assertFalse(self.isIgnored('out'))
+        self.assertTrue(self.isIgnored('lib/cache', True))
+        self.assertFalse(self.isIgnored('lib/cache'))
+
+    def test_escapes(self):
+        self.writeRules('', ['\\#notComment', '\\!bang', 'space\\ ', '# comment', 'file[0-9].c', 'star\\*'])
+        self.assertTrue(self.isIgnored('#notComment'))
+        self.assertFalse(self.isIgnored('# comment'))
+        self.assertTrue(self.isIgnored('!bang'))
+        self.assertTrue(self.isIgnored('space '))
+        self.assertFalse(self.isIgnored('space'))
+        self.assertTrue(self.isIgnored('file5.c'))
+        self.assertFalse(self.isIgnored('fileX.c'))
+        self.assertTrue(self.isIgnored('star*'))
+        self.assertFalse(self.isIgnored('starX'))
+
+    def test_recursiveWildcard(self):
+        self.writeRules('', ['**/gen', 'a/**/b'])
+        self.assertTrue(self.isIgnored('gen', True))
+        self.assertTrue(self.isIgnored('x/y/gen', True))
+        self.assertTrue(self.isIgnored('a/b'))
+        self.assertTrue(self.isIgnored('a/x/y/b'))
+        self.assertFalse(self.isIgnored('x/a/b'))
+
+    def test_matcherReused(self):
+        self.writeRules('', ['*.o'])
+        os.makedirs(os.path.join(self.root, 'src', 'lib'))
+        rootMatcher = ignore.matcherForDirectory(self.root)
+        self.assertIs(ignore.matcherForDirectory(os.path.join(self.root, 'src', 'lib')), rootMatcher)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+test_pathcompleter --- Tests of path and glob completers without GUI
+====================================================================
+
+Run with python -m unittest test_pathcompleter
+"""
+
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import frecency
+import pathcompleter
+
+
+class GlobFrecencyTest(unittest.TestCase):
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        for relPath in ('d/a.txt', 'd/b.txt', 'd/sub/deeper/secret.txt', 'd/sub/c.txt'):
+            path = os.path.join(self.root, relPath)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+        self._savedStore = frecency._store
+        frecency._store = frecency.FrecencyStore(None)
+        for relPath in ('d/sub/deeper/secret.txt', 'd/b.txt', 'd/sub/deeper/secret.txt'):
+            frecency.store().record(os.path.join(self.root, relPath))
+
+    def tearDown(self):
+        frecency._store = self._savedStore
+        shutil.rmtree(self.root)
+
+    def files(self, completer):
+        completer.wait()
+        return completer._files
+
+    def test_glob_seeds_do_not_recurse(self):
+        files = self.files(pathcompleter.makeSuitableCompleter(os.path.join(self.root, 'd/*'), 0))
+        self.assertEqual(files, [os.path.join(self.root, path) for path in ('d/b.txt', 'd/a.txt')])
+
+    def test_recursive_glob_seeds(self):
+        files = self.files(pathcompleter.makeSuitableCompleter(os.path.join(self.root, 'd/**/*.txt'), 0))
+        self.assertEqual(files[:2], [os.path.join(self.root, path)
+                                     for path in ('d/sub/deeper/secret.txt', 'd/b.txt')])
+        self.assertEqual(len(files), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
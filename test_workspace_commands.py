@@ -0,0 +1,45 @@
+"""
+test_workspace_commands --- Tests of Locator commands without GUI
+=================================================================
+
+Run with python -m unittest test_workspace_commands
+"""
+
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from workspace_commands import CommandOpen
+
+
+class OpenGlobTest(unittest.TestCase):
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        for relPath in ('d/a.pyc', 'd/sub/b.pyc', 'd/sub/c.py'):
+            path = os.path.join(self.root, relPath)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def expand(self, relPattern):
+        paths = CommandOpen(0, os.path.join(self.root, relPattern), None)._expandFiles()
+        if paths is None:
+            return None
+        return sorted([os.path.relpath(path, self.root) for path in paths])
+
+    def test_ignored_files_match(self):
+        self.assertEqual(self.expand('d/*.pyc'), ['d/a.pyc'])
+        self.assertEqual(self.expand('d/**/*.pyc'), ['d/a.pyc', 'd/sub/b.pyc'])
+
+    def test_directory_match(self):
+        self.assertEqual(self.expand('d/*'), None)
+        self.assertEqual(self.expand('d/**'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+"""
+treewalker --- Parallel directory tree walker and recursive globs
+=================================================================
+
+Walks a directory tree in several threads and streams found entries.
+Used to expand recursive globs like src/**/test_*.py
+"""
+
+import os
+import os.path
+import re
+import threading
+import Queue
+
+import dirlisting
+import ignore
+
+
+_DONE = object()  # end of results marker
+
+
+class TreeWalker:
+    """Walks a directory tree in several threads.
+
+    Iterate the walker to get (path, isDir) tuples in arbitrary order.
+    Ignored entries are skipped, ignored directories are not walked, see ignore module, unless ignoreRules is False.
+    Symlinks to directories are not followed, so every directory is visited once, and every path is produced once.
+
+    Only entries, for which isMatch(path) returns True, are produced. It is called by the walking threads.
+
+    Count of not consumed results is limited, threads wait, until results are consumed,
+    or the walker is closed or cancelled. Iteration ends, when the walker is closed or cancelled
+    """
+    def __init__(self, root, canDescend=None, isCancelled=None,
+                 threadCount=4, maxPendingResults=10000, isMatch=None, ignoreRules=True):
+        self._canDescend = canDescend
+        self._ignoreRules = ignoreRules
+        self._isMatch = isMatch
+        self._isCancelled = isCancelled
+        self._closed = False
+        self._dirs = Queue.Queue()
+        self._results = Queue.Queue(maxPendingResults)
+        self._pendingDirs = 1  # queued or being scanned
+        self._threadCount = threadCount
+        self._lock = threading.Lock()
+
+        self._dirs.put(root)
+        for index in range(threadCount):
+            thread = threading.Thread(target=self._work, name='TreeWalker')
+            thread.setDaemon(True)
+            thread.start()
+
+    def __iter__(self):
+        try:
+            while True:
+                try:
+                    item = self._results.get(True, 0.1)
+                except Queue.Empty:
+                    if self._isStopped():  # _DONE might be not queued, if results are full
+                        return
+                    continue
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop walking
+        """
+        self._closed = True
+
+    def _isStopped(self):
+        """Check if the walker has been closed or cancelled
+        """
+        return self._closed or \
+               (self._isCancelled is not None and self._isCancelled())
+
+    def _put(self, item):
+        """Put item to results. Waits, while results are full. Returns False, if stopped
+        """
+        while True:
+            try:
+                self._results.put(item, True, 0.1)
+                return True
+            except Queue.Full:
+                if self._isStopped():
+                    return False
+
+    def _work(self):
+        """Thread body. Scans directories from the queue
+        """
+        while True:
+            dirPath = self._dirs.get()
+            if dirPath is _DONE:
+                return
+
+            if not self._isStopped():
+                self._scan(dirPath)
+
+            with self._lock:
+                self._pendingDirs -= 1
+                finished = self._pendingDirs == 0
+
+            if finished:
+                for index in range(self._threadCount):
+                    self._dirs.put(_DONE)
+                self._put(_DONE)
+
+    def _scan(self, dirPath):
+        """Scan one directory. Produce entries, queue subdirectories
+        """
+        try:
+            listing = dirlisting.scan(dirPath)
+        except OSError:
+            return
+
+        matcher = ignore.matcherForDirectory(dirPath) if self._ignoreRules else None
+        for name, flags in zip(listing.names, listing.dirFlags):
+            if matcher is not None and matcher.isIgnored(name, bool(flags)):
+                continue
+            path = os.path.join(dirPath, name)
+            if self._isMatch is None or self._isMatch(path):
+                if not self._put((path, bool(flags))):
+                    return
+            if flags and not flags & dirlisting.LINK and \
+               (self._canDescend is None or self._canDescend(path)):
+                with self._lock:
+                    self._pendingDirs += 1
+                self._dirs.put(path)
+
+
+def isRecursiveGlob(pattern):
+    """Check if pattern contains recursive ** segment
+    """
+    return any([_isRecursiveSegment(segment) for segment in pattern.split('/')])
+
+
+def _isRecursiveSegment(segment):
+    """** matches any count of directories. Longer sequences of * are treated in the same way
+    """
+    return len(segment) > 1 and segment == '*' * len(segment)
+
+
+def _hasMagic(segment):
+    """Check if path segment contains glob wildcards
+    """
+    return '*' in segment or '?' in segment or '[' in segment
+
+
+def globRegExp(pattern, recursive=True):
+    """Translate glob, which might contain ** segments, to regular expression, which matches whole path.
+
+    If recursive is False, ** is the same as *, and wildcards do not match leading ., as in glob.glob()
+    """
+    segments = pattern.split('/')
+    parts = []
+    for index, segment in enumerate(segments):
+        isLast = index == len(segments) - 1
+        if recursive and _isRecursiveSegment(segment):
+            parts.append('.*' if isLast else '(?:.*/)?')
+        else:
+            if not recursive and _hasMagic(segment) and not segment.startswith('.'):
+                parts.append(r'(?!\.)')
+            parts.append(ignore.globSegmentRegExp(segment) + ('' if isLast else '/'))
+    return ''.join(parts) + r'\Z'
+
+
+def iglobRecursive(pattern, isCancelled=None, ignoreRules=True):
+    """Expand glob, which might contain ** segments. Yields (path, isDir) tuples in arbitrary order.
+
+    Tree is walked starting from the longest path prefix without wildcards.
+    Directories, which can not contain matches, are not walked. Ignored paths are skipped, if ignoreRules is True
+    """
+    segments = pattern.split('/')
+    baseSegments = []
+    while len(segments) > 1 and not _hasMagic(segments[0]):
+        baseSegments.append(segments.pop(0))
+
+    if baseSegments == ['']:  # absolute path
+        root = '/'
+    elif baseSegments:
+        root = '/'.join(baseSegments)
+    else:
+        root = os.curdir
+
+    recursiveIndexes = [index for index, segment in enumerate(segments) if _isRecursiveSegment(segment)]
+    recursiveIndex = min(recursiveIndexes or [len(segments)])
+    matcher = re.compile(globRegExp('/'.join(segments)))
+    segmentMatchers = [re.compile(ignore.globSegmentRegExp(segment) + r'\Z') for segment in segments[:recursiveIndex]]
+
+    rootPrefix = os.path.join(root, '')
+
+    def relativePath(path):
+        return path[len(rootPrefix):]
+
+    def canDescend(path):
+        relSegments = relativePath(path).split('/')
+        depth = len(relSegments) - 1
+        if depth >= recursiveIndex:
+            return True
+        if depth >= len(segments) - 1:  # deeper, than the pattern
+            return False
+        return segmentMatchers[depth].match(relSegments[-1]) is not None
+
+    def isMatch(path):
+        return matcher.match(relativePath(path)) is not None
+
+    walker = TreeWalker(root, canDescend, isCancelled, isMatch=isMatch, ignoreRules=ignoreRules)
+    for path, isDir in walker:
+        if root == os.curdir:
+            path = relativePath(path)
+        yield (path, isDir)
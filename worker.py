@@ -0,0 +1,105 @@
+"""
+worker --- Background worker pool for Locator
+=============================================
+
+Runs slow operations (i.e. directory scanning) out of the GUI thread.
+
+Every submitted task gets a generation id. Submitting a new task to a pool makes all older tasks
+of this pool stale. Stale tasks are not started, running tasks shall check Task.isCancelled()
+and stop as soon as possible. Results of stale tasks are never delivered
+"""
+
+import threading
+import traceback
+import Queue
+
+
+class Task:
+    """Handle of a task, submitted to the WorkerPool
+    """
+    def __init__(self, pool, generation, func, callback):
+        self.generation = generation
+        self.result = None
+        self._pool = pool
+        self._func = func
+        self._callback = callback
+        self._cancelled = False
+        self._done = threading.Event()
+
+    def isCancelled(self):
+        """Check if task has been cancelled, or a newer task has been submitted to the pool
+        """
+        return self._cancelled or self.generation != self._pool.generation()
+
+    def cancel(self):
+        """Cancel the task. Result will not be delivered
+        """
+        self._cancelled = True
+
+    def isDone(self):
+        """Check if task has finished or has been dropped
+        """
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """Wait until task finishes. Returns True, if finished, False on timeout
+        """
+        return self._done.wait(timeout)
+
+    def _run(self):
+        """Execute the task. Called in a worker thread
+        """
+        if not self.isCancelled():
+            try:
+                self.result = self._func(self)
+            except Exception:
+                traceback.print_exc()
+
+        # callback is called before the task is marked as done, so waiter will see callback results
+        if not self.isCancelled() and self._callback is not None:
+            self._callback(self)
+        self._done.set()
+
+
+class WorkerPool:
+    """Pool of daemon threads, which execute tasks.
+
+    Threads are started on first use
+    """
+    def __init__(self, threadCount=2):
+        self._threadCount = threadCount
+        self._threads = []
+        self._queue = Queue.Queue()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        """Generation id of the newest submitted task
+        """
+        return self._generation
+
+    def submit(self, func, callback=None):
+        """Submit a task. Returns Task instance.
+
+        func(task) is called in a worker thread. It shall check task.isCancelled() periodically
+        and return result of the task.
+        callback(task) is called in the worker thread, when the task is finished, if it is not cancelled
+        """
+        with self._lock:
+            self._generation += 1
+            task = Task(self, self._generation, func, callback)
+            if len(self._threads) < self._threadCount:
+                thread = threading.Thread(target=self._work, name='WorkerPool')
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
+
+        self._queue.put(task)
+        return task
+
+    def _work(self):
+        """Thread body. Executes tasks forever
+        """
+        while True:
+            task = self._queue.get()
+            task._run()
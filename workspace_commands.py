@@ -1,16 +1,50 @@
 """
-workspace_commands --- Open, SaveAs, GotoLine commands
-======================================================
+workspace_commands --- Open, SaveAs, GotoLine, GotoFile commands
+================================================================
 """
 
+import os
 import os.path
 import glob
 
 from pyparsing import CharsNotIn, Combine, Keyword, Literal, Optional, Or, ParseException, \
                      StringEnd, Suppress, White, Word, nums
 
+import fileindex
+import frecency
+import treewalker
+from fuzzycompleter import FuzzyFileCompleter
 from pathcompleter import makeSuitableCompleter, PathCompleter
-from locator import AbstractCommand
+from locatorcore import AbstractCommand
+from worker import WorkerPool
+
+
+def _iglob(pattern, isCancelled):
+    """glob.iglob(), which checks isCancelled() before listing every directory. Stops, if cancelled
+    """
+    if isCancelled():
+        return
+    dirName, baseName = os.path.split(pattern)
+    if not glob.has_magic(pattern):
+        if (baseName and os.path.lexists(pattern)) or (not baseName and os.path.isdir(dirName)):
+            yield pattern
+        return
+    
+    if not dirName:
+        for name in glob.glob1(os.curdir, baseName):
+            yield name
+        return
+    
+    if dirName != pattern and glob.has_magic(dirName):
+        dirs = _iglob(dirName, isCancelled)
+    else:
+        dirs = [dirName]
+    globInDir = glob.glob1 if glob.has_magic(baseName) else glob.glob0
+    for dirName in dirs:
+        if isCancelled():
+            return
+        for name in globInDir(dirName, baseName):
+            yield os.path.join(dirName, name)
 
 
 class CommandGotoLine(AbstractCommand):
@@ -38,6 +72,12 @@ class CommandGotoLine(AbstractCommand):
         pat.setParseAction(CommandGotoLine.create)
         return pat
     
+    @staticmethod
+    def prefixes():
+        """Leading literals of the command. 'l ' or a digit of the line number
+        """
+        return ['l '] + list(nums)
+    
     @staticmethod
     def create(str, loc, tocs):
         """Callback for pyparsing. Creates an instance of command
@@ -104,6 +144,12 @@ class CommandOpen(AbstractCommand):
         pat.leaveWhitespace()
         pat.setParseAction(CommandOpen.create)
         return pat
+    
+    @staticmethod
+    def prefixes():
+        """Leading literals of the command. 'f ' or anything, path might be typed without it
+        """
+        return ['f ', '']
 
     @staticmethod
     def create(str, loc, tocs):
@@ -121,10 +167,20 @@ class CommandOpen(AbstractCommand):
         
         return [CommandOpen(pathLocation, path, line)]
 
+    # Globs are validated in the background. Only validation of the latest command is actual
+    _validationPool = WorkerPool(1)
+    
+    """Time to wait for glob validation, when user presses Enter. Seconds.
+    Command is not ready to execute, while validation continues
+    """
+    validationTimeout = 1.
+    
     def __init__(self, pathLocation, path, line):
         self._path = path
         self._pathLocation = pathLocation
         self._line = line
+        self._validation = None  # background validation Task
+        self._paths = None  # expanded path, if all matches are files. Memoized by isReadyToExecute()
     
     def completer(self, text, pos):
         """Command completer.
@@ -144,18 +200,66 @@ class CommandOpen(AbstractCommand):
             command += ' %d' % self._line
         return command
 
+    def prepareToExecute(self):
+        """Start validation of a glob in the background
+        """
+        if self._validation is None and self._paths is None and glob.has_magic(self._path):
+            self._validation = self._validationPool.submit(self._expandFiles)
+
+    def _expandFiles(self, task=None):
+        """Expand the path. Returns list of paths, if all matches are files, otherwise None.
+        
+        Stops at the first match, which is not a file, and when the task is cancelled.
+        ** matches any count of directories, as in RecursiveGlobCompleter.
+        Ignored files are not skipped, as glob.glob() does not skip them
+        """
+        isCancelled = task.isCancelled if task is not None else lambda: False
+        pattern = os.path.expanduser(self._path)
+        if treewalker.isRecursiveGlob(pattern):
+            matches = treewalker.iglobRecursive(pattern, isCancelled, ignoreRules=False)
+        else:
+            matches = ((path, not os.path.isfile(path)) for path in _iglob(pattern, isCancelled))
+        
+        paths = []
+        for path, isDir in matches:
+            if isDir or isCancelled():
+                return None
+            paths.append(path)
+        if isCancelled():
+            return None
+        return paths or None
+
     def isReadyToExecute(self):
-        """Check if command is complete and ready to execute
+        """Check if command is complete and ready to execute.
+        
+        Globs are expanded in the background, see prepareToExecute(). If expansion does not finish
+        in validationTimeout, the command is not ready, while validation continues.
+        Expansion is memoized for execute(). Negative result is not memoized, files might be created later
         """
-        files = glob.glob(os.path.expanduser(self._path))
-        return len(files) > 0 and \
-               all([os.path.isfile(p) for p in files])
+        if self._paths is not None:
+            return True
+        if not glob.has_magic(self._path):
+            self._paths = self._expandFiles()
+            return self._paths is not None
+        
+        task = self._validation
+        if task is None or (task.isDone() and task.result is None and task.isCancelled()):  # dropped as stale
+            task = self._validation = self._validationPool.submit(self._expandFiles)
+        if not task.wait(self.validationTimeout):
+            return False
+        
+        self._validation = None
+        self._paths = task.result
+        return self._paths is not None
 
     def execute(self):
         """Execute the command
         """
-        for path in glob.iglob(os.path.expanduser(self._path)):
+        if self._paths is None and not self.isReadyToExecute():
+            return
+        for path in self._paths:
             print 'open file', path, self._line
+            frecency.store().record(path)
 
 
 class CommandSaveAs(AbstractCommand):
@@ -188,6 +292,12 @@ class CommandSaveAs(AbstractCommand):
         pat.leaveWhitespace()
         pat.setParseAction(CommandSaveAs.create)
         return pat
+    
+    @staticmethod
+    def prefixes():
+        """Leading literals of the command
+        """
+        return ['s ']
 
     @staticmethod
     def create(str, loc, tocs):
@@ -235,3 +345,125 @@ class CommandSaveAs(AbstractCommand):
         """Execute command
         """
         print 'save file as', self._path
+
+
+class CommandGotoFile(AbstractCommand):
+    """Go to file Locator command. Fuzzy searches files of the project
+    """
+    
+    """Project root. Current directory, if None
+    """
+    projectRoot = None
+    
+    """Time to wait for the completer to match the query, when user presses Enter. Seconds
+    """
+    matchTimeout = 1.
+    
+    @staticmethod
+    def signature():
+        """Command signature. For Help
+        """
+        return 'g [PATTERN]'
+    
+    @staticmethod
+    def description():
+        """Command description. For Help
+        """
+        return 'Go to file of the project. Fuzzy matching'
+    
+    @staticmethod
+    def pattern():
+        """pyparsing pattern of the command
+        """
+        def attachLocation(s, loc, tocs):
+            return [(loc, tocs[0])]
+
+        query = CharsNotIn(" \t")("query")
+        query.setParseAction(attachLocation)
+
+        pat = (Literal('g ') + Optional(White()) + Optional(query))
+        pat.leaveWhitespace()
+        pat.setParseAction(CommandGotoFile.create)
+        return pat
+    
+    @staticmethod
+    def prefixes():
+        """Leading literals of the command
+        """
+        return ['g ']
+
+    @staticmethod
+    def create(str, loc, tocs):
+        """Callback for pyparsing. Creates an instance
+        """
+        if tocs.query:
+            queryLocation, query = tocs.query
+        else:
+            queryLocation, query = 0, ''
+        
+        return [CommandGotoFile(queryLocation, query)]
+
+    @staticmethod
+    def _root():
+        """Get project root
+        """
+        return CommandGotoFile.projectRoot or os.path.abspath(os.curdir)
+
+    def __init__(self, queryLocation, query):
+        self._query = query
+        self._queryLocation = queryLocation
+        self._completer = None  # FuzzyFileCompleter, which matches the query in the background
+        self._matched = False
+        self._bestMatchPath = None  # memoized by _bestMatch()
+    
+    def completer(self, text, pos):
+        """Command Completer.
+        Returns FuzzyFileCompleter, if cursor stays after the query
+        """
+        if pos == self._queryLocation + len(self._query) or \
+           (not self._query and pos == len(text)):
+            self._completer = FuzzyFileCompleter(self._root(), self._query)
+            return self._completer
+        else:
+            return None
+
+    def constructCommand(self, completableText):
+        """Construct Open command for the clicked file
+        """
+        return 'f ' + completableText
+
+    def _bestMatch(self):
+        """Get absolute path of the best matching file or None. Memoized.
+        
+        The completer matches the query in a worker thread, its result is reused.
+        The query is matched here only if the completer has not been created.
+        None is not memoized, if matching has not finished in matchTimeout
+        """
+        if self._matched or not self._query:
+            return self._bestMatchPath
+        
+        if self._completer is not None:
+            files = self._completer.matchedFiles(self.matchTimeout)
+        else:
+            index = fileindex.projectIndex(self._root())
+            if index is None:
+                files = None
+            else:
+                files = [os.path.join(self._root(), path) \
+                            for score, path, positions in index.match(self._query, 1)]
+        
+        if files is None:
+            return None
+        self._bestMatchPath = files[0] if files else None
+        self._matched = True
+        return self._bestMatchPath
+
+    def isReadyToExecute(self):
+        """Check if command is complete and ready to execute
+        """
+        return self._bestMatch() is not None
+
+    def execute(self):
+        """Open the best matching file
+        """
+        print 'open file', self._bestMatch(), None